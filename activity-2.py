@@ -1,11 +1,12 @@
 import numpy
 import math
 import pandas as pd
-import matplotlib.pyplot as plt
+from plotting import plt
+import gam_data
 
-#input data file
+#input data file, loaded from a memory-mapped binary cache
 dataFile = 'GSE64881_segmentation_at_30000bp.passqc.multibam.txt'
-df = pd.read_csv(dataFile,sep='\t').iloc[:,3:]
+df = gam_data.loadSegmentationData(dataFile)[1]
 
 #Part 1: Estimate the radial position of each NP (apical=1 - equitorial=5)
 column_sums = df.sum(axis=0)
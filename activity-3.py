@@ -1,24 +1,22 @@
 import numpy
 import math
 import pandas as pd
-import matplotlib.pyplot as plt
+import gam_data
+from genome_index import WindowIndex, hist1Region
+from plotting import plt
 
 def main():
     #input data file
     dataFile = 'GSE64881_segmentation_at_30000bp.passqc.multibam.txt'
-    df = pd.read_csv(dataFile,sep='\t')
+    #windowValuesDf columns denote chromosome name and start and stop position, windowDetectionsDf columns denote an NP
+    #rows denote a window in both; loaded from a memory-mapped binary cache of dataFile
+    windowValuesDf, windowDetectionsDf = gam_data.loadSegmentationData(dataFile)
 
     #open output file
     outputFile = open("reports/activity-3-report.md", 'w')
     outputFile.write("# Activity 3 Report\n")
     outputFile.write("The Hist1 region is present on mouse chromosome 13 between 21.7 and 24.1 Mb\n")
 
-    #columns denote an NP, rows denote a window
-    windowDetectionsDf = df.iloc[:,3:]
-
-    #columns denote chromosome name and start and stop position, rows denote a window
-    windowValuesDf = df.iloc[:,0:3]
-
     #Step 1
     hist1Windows = findHist1Windows(windowValuesDf)
     hist1WindowDetectionsDf = windowDetectionsDf.iloc[hist1Windows,:]
@@ -89,18 +87,7 @@ def main():
 
 #returns a list of numbers of chr13 windows that are between 21.7 and 24.1 Mb
 def findHist1Windows(windowValuesDf):
-    chromType = "chr13"
-    startRange = 21700000
-    endRange = 24100000
-    hist1Windows = []
-
-    for index in range(0,windowValuesDf.shape[0]):
-        windowStart = windowValuesDf['start'][index]
-        windowEnd = windowValuesDf['stop'][index]
-        windowChrom = windowValuesDf['chrom'][index]
-        if (windowStart >= startRange and windowEnd <= endRange and windowChrom == chromType):
-            hist1Windows.append(index)
-    return hist1Windows
+    return numpy.sort(WindowIndex(windowValuesDf).queryRegion(hist1Region, contained=True)).tolist()
 
 #for each NP in hist1NPs, finds the amount of hist1Windows detected by it. Returns series
 def windowsPerNP(hist1WindowDetectionsDf):
@@ -1,15 +1,21 @@
 import numpy
 import math
 import pandas as pd
-import matplotlib.pyplot as plt
+import gam_data
+from plotting import plt, sns
 import hist1_analysis as h1_mod
-import seaborn as sns
+import hierarchical
+import sys
 
 
-def main():
+#leafOrderMethod: None keeps the NPs in file order, 'average', 'complete' or 'ward' reorders every heat map by the leaf
+#order of a hierarchical clustering of the Jaccard distances
+def main(leafOrderMethod=None):
     #input data file
     dataFile = 'GSE64881_segmentation_at_30000bp.passqc.multibam.txt'
-    df = pd.read_csv(dataFile,sep='\t')
+    #windowValuesDf columns denote chromosome name and start and stop position, windowDetectionsDf columns denote an NP
+    #rows denote a window in both; loaded from a memory-mapped binary cache of dataFile
+    windowValuesDf, windowDetectionsDf = gam_data.loadSegmentationData(dataFile)
 
     #open output file
     outputFile = open("reports/activity-5-report.md", 'w')
@@ -18,25 +24,26 @@ def main():
     outputFile.write('The index/similarity J(A, B) can be found with the equation `|A INTERSECT B| / |A UNION B|`\n\n')
     outputFile.write('The Jaccard Distance can be found 1-J\n\n')
 
-    #columns denote an NP, rows denote a window
-    windowDetectionsDf = df.iloc[:,3:]
-
-    #columns denote chromosome name and start and stop position, rows denote a window
-    windowValuesDf = df.iloc[:,0:3]
-
     #extract Hist1 windows and NPs
     hist1Windows = h1_mod.findHist1Windows(windowValuesDf)
     hist1WindowDetectionsDf = windowDetectionsDf.iloc[hist1Windows,:]
     hist1NpSums = h1_mod.windowsPerNP(hist1WindowDetectionsDf)
     hist1NPs = hist1NpSums.index
 
-    #construct a matrix of Jaccard Indices for each pair of NPs
-    jaccardData = [[jaccard(a,b,hist1WindowDetectionsDf) for a in hist1NPs] for b in hist1NPs]
-    npJaccards = pd.DataFrame(data=jaccardData, index=hist1NPs, columns=hist1NPs)
-
-    #construct a matrix of Jaccard Distances for each pair of NPs
-    jaccardDistData = [[1-jaccard(a,b,hist1WindowDetectionsDf) for a in hist1NPs] for b in hist1NPs]
-    npJaccardDists = pd.DataFrame(data=jaccardDistData, index=hist1NPs, columns=hist1NPs)
+    #construct matrices of Jaccard Indices and Jaccard Distances for each pair of NPs
+    jaccardMatrices = h1_mod.jaccardMatrices(hist1WindowDetectionsDf, hist1NPs)
+    npJaccards = jaccardMatrices['jaccard']
+    npJaccardDists = jaccardMatrices['distance']
+
+    #optionally reorder the NPs by the leaves of a hierarchical clustering, so similar NPs are next to each other
+    if leafOrderMethod is not None:
+        tree = hierarchical.clusterHierarchy(h1_mod.condensedJaccardDistances(hist1WindowDetectionsDf, hist1NPs, normalized=False), leafOrderMethod)
+        hierarchical.plotDendrogram(tree, hist1NPs, 'Hist1 NP Dendrogram (' + leafOrderMethod + ' linkage)', 'charts/activity-5-dendrogram.png')
+        outputFile.write('![NP Dendrogram](../charts/activity-5-dendrogram.png)\n\n')
+        outputFile.write('Heat maps below are ordered by the leaves of the ' + leafOrderMethod + ' linkage dendrogram\n\n')
+        hist1NPs = hist1NPs[hierarchical.leafOrder(tree)]
+        npJaccards = npJaccards.loc[hist1NPs, hist1NPs]
+        npJaccardDists = npJaccardDists.loc[hist1NPs, hist1NPs]
     
     #make a heat map for similarities
     plt.figure()
@@ -58,8 +65,8 @@ def main():
                         windows detected by the NP\n\n''')
     
     #clarify the jaccard index heat map by dividing each value by the detection count
-    simValData = [[jaccard(a,b,hist1WindowDetectionsDf)/hist1WindowDetectionsDf[a].sum() for a in hist1NPs] for b in hist1NPs]
-    simValMatrix = pd.DataFrame(data=simValData,index=hist1NPs,columns=hist1NPs)
+    #divide by position, so the columns keep the (leaf) order of npJaccards
+    simValMatrix = npJaccards / hist1NpSums.loc[npJaccards.columns].to_numpy()
     plt.figure()
     sns.heatmap(simValMatrix, cmap = "Blues")
     plt.savefig('charts/activity-5-similarity-values.png')
@@ -80,13 +87,6 @@ def main():
     return
 
 
-
-#Given two NPs, find their Jaccard Index
-def jaccard(npA, npB, hist1WindowDetectionsDf):
-    A = (hist1WindowDetectionsDf[npA] == 1)
-    B = (hist1WindowDetectionsDf[npB] == 1)
-    if (A & B).sum() == 0: return 0
-    return  (A & B).sum() / (A | B).sum()
-
+#usage: python activity-5.py [average|complete|ward]
 if __name__ == "__main__":
-    main()
+    main(sys.argv[1] if len(sys.argv) > 1 else None)
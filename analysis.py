@@ -1,41 +1,33 @@
-import numpy
+import argparse
 import pandas as pd
+import dataset_summary
 
-#input data file
-dataFile = 'GSE64881_segmentation_at_30000bp.passqc.multibam.txt'
-myData = pd.read_csv(dataFile,sep='\t')
+#usage: python analysis.py [--data file] [--percentiles 5 50 95 ...] [--chunk-rows n] [--sparse]
+def main():
+    parser = argparse.ArgumentParser(description='Summarize the windows and NPs of a segmentation table')
+    parser.add_argument('--data', default='GSE64881_segmentation_at_30000bp.passqc.multibam.txt')
+    parser.add_argument('--percentiles', nargs='+', type=float, default=dataset_summary.summaryPercentiles)
+    parser.add_argument('--chunk-rows', type=int, default=dataset_summary.summaryChunkRows,
+                        help='windows read from the memory-mapped detection matrix at a time')
+    parser.add_argument('--sparse', action='store_true', help='read the sparse cache of the detection matrix')
+    args = parser.parse_args()
 
-#count the number of windows and NPs
-windowCount = len(myData['chrom'])
-npCount = len(list(myData.columns))-3
+    summary = dataset_summary.datasetSummary(args.data, args.percentiles, args.chunk_rows, args.sparse)
+    npSummary, windowSummary = summary['npSummary'], summary['windowSummary']
 
-print('1. Number of genomic windows:',windowCount)
-print('2. Number of NPs:',npCount)
+    print('1. Number of genomic windows:',summary['windows'])
+    print('2. Number of NPs:',summary['nps'])
+    print('   Total detections:',summary['detections'])
+    print('3. Average number of windows in each NP:',npSummary.get('mean'))
+    print('4. Minimum windows in an NP:',npSummary.get('min'))
+    print('   Maximum windows in an NP:',npSummary.get('max'))
+    print('5. Average number of NPs each window is in:',windowSummary.get('mean'))
+    print('   Minimum NPs a window is in:',windowSummary.get('min'))
+    print('   Maximum NPs a window is in:',windowSummary.get('max'))
+    print()
+    print(pd.DataFrame({'windows per NP': npSummary, 'NPs per window': windowSummary}).to_string())
+    print()
+    print(summary['chromosomes'].to_string())
 
-#determine counts of windows in each NP
-columns = list(myData.columns)[3:]
-wSum = 0
-wMin = windowCount
-wMax = 0
-for c in columns:
-    wSum += myData[c].sum()
-    wMin = min(wMin,myData[c].sum())
-    wMax = max(wMax,myData[c].sum())
-windowAvg = wSum/len(columns)
-print('3. Average number of windows in each NP:',windowAvg)
-print('4. Minimum windows in an NP:',wMin)
-print('   Maximum windows in an NP:',wMax)
-
-#Determine count of NPs that each window appears in
-nSum = 0
-nMin = npCount 
-nMax = 0 
-for i in range(0,windowCount):
-    rowSum = myData.iloc[i][3:].sum()
-    nSum += rowSum
-    nMin = min(nMin,rowSum)
-    nMax = max(nMax,rowSum)
-nAvg = nSum/windowCount 
-print('5. Average number of NPs each window is in:',nAvg)
-print('   Minimum NPs a window is in:',nMin)
-print('   Maximum NPs a window is in:',nMax)
+if __name__ == "__main__":
+    main()
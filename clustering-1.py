@@ -1,27 +1,24 @@
 import numpy
 import math
 import pandas as pd
-import matplotlib.pyplot as plt
+import gam_data
+from plotting import plt, sns
 import hist1_analysis as h1_mod
-import seaborn as sns
 import random
+import kmedoids
 
 
 def main():
     #input data file
     dataFile = 'GSE64881_segmentation_at_30000bp.passqc.multibam.txt'
-    df = pd.read_csv(dataFile,sep='\t')
+    #windowValuesDf columns denote chromosome name and start and stop position, windowDetectionsDf columns denote an NP
+    #rows denote a window in both; loaded from a memory-mapped binary cache of dataFile
+    windowValuesDf, windowDetectionsDf = gam_data.loadSegmentationData(dataFile)
 
     #open output file
     outputFile = open("reports/clustering-1-report.md", 'w')
     outputFile.write('# Clustering 1 Report\n')
 
-    #columns denote an NP, rows denote a window
-    windowDetectionsDf = df.iloc[:,3:]
-
-    #columns denote chromosome name and start and stop position, rows denote a window
-    windowValuesDf = df.iloc[:,0:3]
-
     #extract Hist1 windows and NPs
     hist1Windows = h1_mod.findHist1Windows(windowValuesDf)
     hist1WindowDetectionsDf = windowDetectionsDf.iloc[hist1Windows,:]
@@ -29,8 +26,7 @@ def main():
     hist1NPs = list(hist1NpSums.index)
 
     #construct a matrix of Jaccard Indices for each pair of NPs
-    jaccardData = [[normalizedJaccard(a,b,hist1WindowDetectionsDf) for a in hist1NPs] for b in hist1NPs]
-    npJaccards = pd.DataFrame(data=jaccardData, index=hist1NPs, columns=hist1NPs)
+    npJaccards = h1_mod.jaccardMatrices(hist1WindowDetectionsDf, hist1NPs)['normalizedJaccard']
     
     #make a heat map for similarities
     plt.figure()
@@ -44,19 +40,12 @@ def main():
     clusterMedoids = random.sample(hist1NPs,3)
     clusterPreferences = [random.randint(0,3) for x in hist1NPs]
         #An arbitrary preference of which cluster to be assigned to in case of a tie
-    clusterAssignments = assignKMeansCluster(hist1NPs, clusterMedoids, npJaccards, clusterPreferences)
-    clusters = arrangeClusters(clusterAssignments, 3)
-    running = True
-    iterations = 1
-    while (running):
-        clusterMedoids = [findClusterMedoid(c,npJaccards) for c in clusters]
-        nextAssignments = assignKMeansCluster(hist1NPs, clusterMedoids, npJaccards, clusterPreferences)
-        nextClusters = arrangeClusters(clusterAssignments,3)
-        if (nextAssignments == clusterAssignments):
-            running = False
-        clusterAssignments = nextAssignments
-        clusters = nextClusters
-        iterations += 1
+    npPositions = {np: i for i, np in enumerate(hist1NPs)}
+    labels, medoids, iterations = kmedoids.runKMedoids(npJaccards.to_numpy(), [npPositions[m] for m in clusterMedoids],
+                                                       clusterPreferences, rng=numpy.random.default_rng())
+        #ties between medoid candidates are broken randomly
+    clusters = kmedoids.labelsToClusters(labels, hist1NPs, 3)
+    clusterMedoids = [hist1NPs[m] for m in medoids]
     
     clusteringScore = assessClusteringQuality(clusters,clusterMedoids,npJaccards)
 
@@ -77,7 +66,7 @@ def main():
         outputFile.write('Cluster ' + str(i) + ' contains ' + str(len(c)) + ' elements\n\n')
     
     #make a heat map showing similarities between NPs in different clusters
-    sepMatrix = [[(npJaccards[npA][npB] if (clusterAssignments[a][0] != clusterAssignments[b][0]) else -1) for a,npA in enumerate(hist1NPs)] for b,npB in enumerate(hist1NPs)]
+    sepMatrix = [[(npJaccards[npA][npB] if (labels[a] != labels[b]) else -1) for a,npA in enumerate(hist1NPs)] for b,npB in enumerate(hist1NPs)]
     sepDf = pd.DataFrame(data=sepMatrix,index=hist1NPs,columns=hist1NPs)
     plt.figure()
     sns.heatmap(sepDf,cmap='Reds')
@@ -93,41 +82,6 @@ def main():
 def assessClusteringQuality(clusters, medoids, npJaccards):
     return sum([sum([(1-npJaccards[np][med]) for np in c]) for (c, med) in zip(clusters,medoids)])
 
-#Assign each element of hist1NPs to a cluster with an element of clusterMedoids at its center
-#Each element of the returned list denotes an NP, containing [cluster, np]
-def assignKMeansCluster(hist1NPs, clusterMedoids, npJaccards, preferences):
-    return [[assignCluster(clusterMedoids,n,npJaccards,pref),n] for (n,pref) in zip(hist1NPs,preferences)]
-
-#Given an NP and the NPs at the center of each cluster, determine which cluster is closest
-def assignCluster(clusterMedoids, np, npJaccards, preference):
-    clusterSimilarities = [npJaccards[np][c] for c in clusterMedoids]
-    return randMax(clusterSimilarities,randOffset=preference)
-
-#Given the cluster assigned to each element, return k lists of NPs in each cluster
-def arrangeClusters(clusterAssignments, k):
-    return [list(map(lambda x : x[1], filter(lambda x: x[0] == i, clusterAssignments))) for i in range(0,k)]
-
-#Given a list of NPs in a cluster, find the medoid - the NP with the maximum average similarity to all other NPs in the cluster
-def findClusterMedoid(cluster, npJaccards):
-    avgSimilarities = [sum([(npJaccards[n][cn]) for cn in cluster])/len(cluster) for n in cluster]
-    return cluster[randMax(avgSimilarities)]
-
-#Given a list of numbers, return the index of the maximum number
-#If there are multiple maximums, choose one randomly
-def randMax(dataList,randOffset=-1):
-    maxVal = max(dataList)
-    doubledList = dataList + dataList
-    if (randOffset == -1):
-        randOffset = random.randint(0,len(dataList)-1)
-    return doubledList.index(maxVal,randOffset) % len(dataList)
-
-#Given two NPs, find their Normalized Jaccard Index - Jn(A,B) = (A INTERSECTION B) / min(|A|, |B|)
-def normalizedJaccard(npA, npB, hist1WindowDetectionsDf):
-    A = (hist1WindowDetectionsDf[npA] == 1)
-    B = (hist1WindowDetectionsDf[npB] == 1)
-    if (A | B).sum() == 0: return 0
-    return (A & B).sum() / min(A.sum(), B.sum())
-
 
 if __name__ == "__main__":
     main()
@@ -1,31 +1,29 @@
 import numpy
 import math
 import pandas as pd
-import matplotlib.pyplot as plt
+import gam_data
+import feature_tracks
+from plotting import plt, sns
 import hist1_analysis as h1_mod
-import seaborn as sns
 import random
-import plotly.express as px
-import plotly.graph_objects as go
+import hierarchical
+import sys
 
-def main():
+#leafOrderMethod: None keeps the windows in genomic order, 'average', 'complete' or 'ward' reorders the linkage heat maps by
+#the leaf order of a hierarchical clustering of the linkage distances
+def main(leafOrderMethod=None):
     #input data file
     dataFile = 'GSE64881_segmentation_at_30000bp.passqc.multibam.txt'
-    df = pd.read_csv(dataFile,sep='\t')
+    #windowValuesDf columns denote chromosome name and start and stop position, windowDetectionsDf columns denote an NP
+    #rows denote a window in both; loaded from a memory-mapped binary cache of dataFile
+    windowValuesDf, windowDetectionsDf = gam_data.loadSegmentationData(dataFile)
 
     featureFile = 'Hist1_region_features.csv'
-    featureDf = pd.read_csv(featureFile)
 
     #open output file
     outputFile = open("reports/co-segregation-1-report.md", 'w')
     outputFile.write('# Co-segregation 1 Report\n')
 
-    #columns denote an NP, rows denote a window
-    windowDetectionsDf = df.iloc[:,3:]
-
-    #columns denote chromosome name and start and stop position, rows denote a window
-    windowValuesDf = df.iloc[:,0:3]
-
     #extract Hist1 windows and NPs
     hist1Windows = h1_mod.findHist1Windows(windowValuesDf)
     hist1WindowDetectionsDf = windowDetectionsDf.iloc[hist1Windows,:]
@@ -33,16 +31,22 @@ def main():
     hist1NpSums = h1_mod.windowsPerNP(hist1WindowDetectionsDf)
     hist1NPs = list(hist1NpSums.index)
 
-    #change indices of featureDf to be the same as windowValuesDf
-    featureDf = featureDf.set_index(hist1WindowValuesDf.index)
+    #feature annotations of the Hist1 windows, joined on their coordinates
+    featureDf = feature_tracks.regionFeatures(featureFile, hist1WindowValuesDf)
 
     #create the normalized linkage table
-    linkageArray = [[0.0 for i in hist1WindowDetectionsDf.index] for x in hist1WindowDetectionsDf.index]
     indices = hist1WindowDetectionsDf.index
-    linkageTable = pd.DataFrame(linkageArray,index=indices,columns=indices)
-    for i in indices:
-        for x in indices:
-            linkageTable.loc[i,x] = normalizedLinkage(hist1WindowDetectionsDf.loc[i,:],hist1WindowDetectionsDf.loc[x,:])
+    linkageTable = h1_mod.normalizedLinkageMatrix(hist1WindowDetectionsDf)
+
+    #optionally reorder the windows by the leaves of a hierarchical clustering, so linked windows are next to each other
+    #distances are 1 - the linkage table above, so the linkage is only computed once
+    if leafOrderMethod is not None:
+        tree = hierarchical.clusterHierarchy(hierarchical.condensedFromSquare(1 - linkageTable.to_numpy()), leafOrderMethod)
+        hierarchical.plotDendrogram(tree, indices, 'Hist1 Window Dendrogram (' + leafOrderMethod + ' linkage)', 'charts/co-segregation-1/dendrogram.png')
+        outputFile.write('![Window Dendrogram](../charts/co-segregation-1/dendrogram.png)\n\n')
+        outputFile.write('Linkage heat maps below are ordered by the leaves of the ' + leafOrderMethod + ' linkage dendrogram\n\n')
+        indices = indices[hierarchical.leafOrder(tree)]
+        linkageTable = linkageTable.loc[indices, indices]
 
 
     #create a heat map of the linkage table
@@ -93,30 +97,6 @@ def main():
 
     return 
 
-#number of NPs in which a window is detected, divided by total numbers of NPs
-def detectionFrequency(window):
-    return sum(window) / len(window)
-
-#number of NPs with both windows A and B, divided by total number of NPs
-def coSegregation(windowA, windowB):
-    return sum(windowA & windowB) / len(windowA)
-
-#coSegregation(A,B) - detectionFrequency(A)*detectionFrequency(B)
-def linkage(windowA, windowB):
-    return coSegregation(windowA,windowB) - detectionFrequency(windowA) * detectionFrequency(windowB)
-
-#divide linkage by its theoretical maximum
-def normalizedLinkage(windowA, windowB):
-    D = linkage(windowA,windowB)
-    fA = detectionFrequency(windowA)
-    fB = detectionFrequency(windowB)
-    fAB = coSegregation(windowA,windowB)
-    if D < 0:
-        return D / min(fA * fB, (1-fA) * (1-fB))
-    elif D > 0:
-        return D / min(fB * (1-fA), fA * (1-fB))
-    return 0
-
 # D-norm will be 1 when two windows have the maximum amount of shared NPs, and -1 when they have the minimum
 
 # Notes on normalized linkage being divided by zero:
@@ -125,5 +105,6 @@ def normalizedLinkage(windowA, windowB):
 #   case, D-norm should be 1 or -1)
 
 
+#usage: python co-segregation-1.py [average|complete|ward]
 if __name__ == "__main__":
-    main()
+    main(sys.argv[1] if len(sys.argv) > 1 else None)
@@ -1,32 +1,29 @@
 import numpy
 import math
 import pandas as pd
-import matplotlib.pyplot as plt
+import gam_data
+import feature_tracks
+from plotting import plt, sns, nx
 import hist1_analysis as h1_mod
-import seaborn as sns
+import linkage_network
+import graph_communities
+import graph_layout
+import permutation_tests
 import random
-import plotly.express as px
-import plotly.graph_objects as go
-import networkx as nx
 
 def main():
     #input data file
     dataFile = 'GSE64881_segmentation_at_30000bp.passqc.multibam.txt'
-    df = pd.read_csv(dataFile,sep='\t')
+    #windowValuesDf columns denote chromosome name and start and stop position, windowDetectionsDf columns denote an NP
+    #rows denote a window in both; loaded from a memory-mapped binary cache of dataFile
+    windowValuesDf, windowDetectionsDf = gam_data.loadSegmentationData(dataFile)
 
     featureFile = 'Hist1_region_features.csv'
-    featureDf = pd.read_csv(featureFile)
 
     #open output file
     outputFile = open("reports/community-detection-1-report.md", 'w')
     outputFile.write('# Community Detection Report\n')
 
-    #columns denote an NP, rows denote a window
-    windowDetectionsDf = df.iloc[:,3:]
-
-    #columns denote chromosome name and start and stop position, rows denote a window
-    windowValuesDf = df.iloc[:,0:3]
-
     #extract Hist1 windows and NPs
     hist1Windows = h1_mod.findHist1Windows(windowValuesDf)
     hist1WindowDetectionsDf = windowDetectionsDf.iloc[hist1Windows,:]
@@ -34,124 +31,101 @@ def main():
     hist1NpSums = h1_mod.windowsPerNP(hist1WindowDetectionsDf)
     hist1NPs = list(hist1NpSums.index)
 
-    #change indices of featureDf to be the same as windowValuesDf
-    featureDf = featureDf.set_index(hist1WindowValuesDf.index)
+    #feature annotations of the Hist1 windows, joined on their coordinates
+    featureDf = feature_tracks.regionFeatures(featureFile, hist1WindowValuesDf)
 
     #create the normalized linkage table
-    linkageArray = [[0.0 for i in hist1WindowDetectionsDf.index] for x in hist1WindowDetectionsDf.index]
     indices = hist1WindowDetectionsDf.index
-    linkageTable = pd.DataFrame(linkageArray,index=indices,columns=indices)
-    for i in indices:
-        for x in indices:
-            linkageTable.loc[i,x] = h1_mod.normalizedLinkage(hist1WindowDetectionsDf.loc[i,:],hist1WindowDetectionsDf.loc[x,:])
-
-
-    #find the average of all linkages
-    sum = 0
-    div = 0
-    for i in indices:
-        for x in indices:
-            if i != x:
-                sum += linkageTable.loc[i,x]
-                div += 1
-    averageLinkage = sum/div
-
-    #convert linkage table to an adjacency matrix
-    linkageGraph = linkageTable.copy(deep=True)
-    for i in indices:
-        for x in indices:
-            if i == x:
-                linkageGraph.loc[i,x] = 0 
-            elif linkageTable.loc[i,x] > averageLinkage:
-                linkageGraph.loc[i,x] = 1
-            else:
-                linkageGraph.loc[i,x] = 0
+    linkageTable = h1_mod.normalizedLinkageMatrix(hist1WindowDetectionsDf)
+
+
+    #connect each pair of windows whose linkage is above the average of all linkages
+    adjacency, averageLinkage = linkage_network.linkageAdjacency(linkageTable, 'mean', sparse=True)
 
     #find degree centrality of each window, and the hubs (top 5)
-    degreeCentrality = (linkageGraph.sum() / (len(indices)-1)).sort_values(ascending=False)
-    hubs = list(degreeCentrality.head(5).index)
+    degreeCentrality = pd.Series(linkage_network.degreeCentrality(adjacency), index=indices)
+    hubs = list(linkage_network.rankCentralities(degreeCentrality, indices).head(5)['node'])
+
+    #detect communities by modularity optimization; communities are numbered from the largest
+    communityLabels, communityModularity = graph_communities.detectCommunities(adjacency, 'louvain', seed=random.randrange(2**32))
+    communities = graph_communities.communityMembers(communityLabels)
+    reportedCommunities = min(5, len(communities))
+    communityFeatureDf = (featureDf[['Hist1','LAD']] == 1).astype(int)
+    featureCounts = graph_communities.communityFeatureCounts(communityLabels, communityFeatureDf)
+    #significance of the feature fractions of each community against 1000 circular shifts of the features along the region,
+    #which keep the runs of neighboring windows sharing a feature
+    significance = permutation_tests.permutationTest(communityFeatureDf.to_numpy(), communityLabels, ['Hist1','LAD'],
+                                                     mode='shift', permutations=1000, seed=random.randrange(2**32), workers=1)
+    outputFile.write(f'{len(communities)} communities found with Louvain modularity optimization, modularity {round(communityModularity,4)}\n\n')
+    outputFile.write(f'Z-scores and two-sided p-values of the feature percentages compare each community to 1000 circular shifts of the features along the region\n\n')
 
     #create a graph showing all nodes
+    edgeRows, edgeColumns = linkage_network.adjacencyEdges(adjacency)
     g = nx.Graph()
-    for i in indices:
-        for x in indices:
-            if i > x and linkageGraph.loc[i,x]:
-                g.add_edge(i,x)
-    pos = nx.spring_layout(g,iterations=1000)
+    g.add_edges_from(zip(indices[edgeRows], indices[edgeColumns]))
+    #force-directed layout of every window, cached on disk and shared with network-centrality-1.py
+    pos = graph_layout.cachedLayout(adjacency, indices, iterations=1000)
     plt.figure()
-    for i in indices:
-        if degreeCentrality[i] > 0:
-            s = 20
-            if i in hubs:
-                s = 100
-            commCount = 0
-            if i in hubs:
-                commCount = 1
-            for h in hubs:
-                if linkageGraph.loc[i,h]:
-                    commCount += 1
-            colors = ['tab:red','tab:orange','tab:olive','tab:green','tab:blue','tab:purple']
-            nx.draw_networkx_nodes(g,nodelist=[i],node_size=s,pos=pos,node_color=colors[commCount])
+    colors = ['tab:red','tab:orange','tab:olive','tab:green','tab:blue']
+    for c in range(reportedCommunities):
+        communityNodes = [i for i in indices[communities[c]] if i in g]
+        nx.draw_networkx_nodes(g,nodelist=communityNodes,node_size=[100 if i in hubs else 20 for i in communityNodes],pos=pos,node_color=colors[c])
+    otherNodes = [i for i in indices[communityLabels >= reportedCommunities] if i in g]
+    nx.draw_networkx_nodes(g,nodelist=otherNodes,node_size=[100 if i in hubs else 20 for i in otherNodes],pos=pos,node_color='tab:gray')
     nx.draw_networkx_edges(g,pos=pos)
     plt.tight_layout()
     savefile = f'charts/community-detection-1/full-network-graph.png'
     plt.savefig(savefile)
     outputFile.write(f'![Full network graph](../{savefile})\n\n')
     outputFile.write(f'This graph shows the full network on windows. The larger nodes are the hubs, with the largest degree centralities. ')
-    outputFile.write(f'The nodes are colored from red to purple, according to the number of communities they are in (0-5)\n\n')
+    outputFile.write(f'The nodes of the {reportedCommunities} largest communities are colored from red to blue, other nodes are gray\n\n')
 
 
     #report data on each community
-    for c,h in enumerate(hubs):
-        community = []
-        for i in indices:
-            if linkageGraph.loc[h,i] or i == h:
-                community.append(i)
-        hist1Count = 0
-        ladCount = 0
-        for i in community:
-            if featureDf.loc[i,'Hist1'] == 1:
-                hist1Count += 1
-            if featureDf.loc[i,'LAD'] == 1:
-                ladCount += 1
+    for c in range(reportedCommunities):
+        community = indices[communities[c]]
+        hist1Count = featureCounts.loc[c,'Hist1']
+        ladCount = featureCounts.loc[c,'LAD']
         outputFile.write(f'### Community {c+1}\n\n')
         outputFile.write(f'Size: {len(community)} nodes\n\n')
-        outputFile.write(f'{hist1Count} nodes contain hist1 gene: {round(100*hist1Count/len(community),2)}%\n\n')
-        outputFile.write(f'{ladCount} nodes contain a LAD: {round(100*ladCount/len(community),2)}%\n\n')
+        outputFile.write(f'{hist1Count} nodes contain hist1 gene: {round(100*hist1Count/len(community),2)}% ')
+        outputFile.write(f"(z-score {round(significance['zScore'].loc[c,'Hist1'],2)}, p-value {round(significance['pValue'].loc[c,'Hist1'],4)})\n\n")
+        outputFile.write(f'{ladCount} nodes contain a LAD: {round(100*ladCount/len(community),2)}% ')
+        outputFile.write(f"(z-score {round(significance['zScore'].loc[c,'LAD'],2)}, p-value {round(significance['pValue'].loc[c,'LAD'],4)})\n\n")
 
         outputFile.write(f'Nodes in community:\n\n```')
-        for i in community:
-            outputFile.write(f'{i} ')
+        outputFile.write(' '.join(str(i) for i in community) + ' ')
         outputFile.write('```\n\n')
 
         #create graph of community
         g = nx.Graph()
-        for i in community:
-            for j in community:
-                if i > j and linkageGraph.loc[i,j]:
-                    g.add_edge(i,j)
-        pos = nx.spring_layout(g,iterations=1000)
+        g.add_nodes_from(community)
+        communityEdges = (communityLabels[edgeRows] == c) & (communityLabels[edgeColumns] == c)
+        g.add_edges_from(zip(indices[edgeRows[communityEdges]], indices[edgeColumns[communityEdges]]))
+        #refine the community's positions in the full network layout
+        communityPos = graph_layout.subgraphLayout(adjacency, indices, communities[c], pos, iterations=100)
         plt.figure()
-        for i in community:
-            nx.draw_networkx_nodes(g,nodelist=[i],node_size=(degreeCentrality[i]*99+1),pos=pos)
-        nx.draw_networkx_edges(g,pos=pos)
+        nx.draw_networkx_nodes(g,nodelist=list(community),node_size=list(degreeCentrality[community]*99+1),pos=communityPos)
+        nx.draw_networkx_edges(g,pos=communityPos)
 
         plt.tight_layout()
         savefile = f'charts/community-detection-1/community-{c+1}-graph.png'
         plt.savefig(savefile)
         outputFile.write(f'![Community {c+1}](../{savefile})\n\n')
 
-        communityTable = [[1 if (i in community and x in community and linkageGraph.loc[i,x]) else 0 for i in indices] for x in indices]
+        #connections inside the community, every other pair 0
+        inCommunity = communityLabels == c
+        communityTable = adjacency.multiply(inCommunity[:,None]).multiply(inCommunity[None,:]).toarray().astype(int)
         communityDf = pd.DataFrame(communityTable, index=indices, columns=indices)
         plt.figure()
         sns.heatmap(communityDf,cmap='bwr')
         plt.title(f'Community {c+1}')
         savefile = f'charts/community-detection-1/community-{c+1}-heat-map.png'
         plt.savefig(savefile)
-    
+
 
     outputFile.write(f'## Heat maps\n\nEach heat map shows connections between nodes in a community as red\n\n')
-    for c,h in enumerate(hubs):
+    for c in range(reportedCommunities):
         outputFile.write(f'![Community {c+1} heat map](../charts/community-detection-1/community-{c+1}-heat-map.png)\n\n')
 
     
@@ -0,0 +1,99 @@
+import numpy
+import pandas as pd
+import scipy.sparse
+import gam_data
+
+#number of windows read from the detection matrix at a time
+summaryChunkRows = 20000
+
+#percentiles reported for the detections of each window and each NP
+summaryPercentiles = [5, 25, 50, 75, 95]
+
+#row sums of a chunk of a dense or scipy.sparse detection matrix, and the product indicator.T @ chunk as an array
+def chunkSums(chunk, indicator):
+    if scipy.sparse.issparse(chunk):
+        return numpy.asarray(chunk.sum(axis=1)).ravel().astype(numpy.int64), (indicator.T @ chunk).toarray()
+    chunk = numpy.asarray(chunk)
+    return chunk.sum(axis=1, dtype=numpy.int64), numpy.asarray(indicator.T @ chunk)
+
+#One pass over the detection matrix (windows x NPs; memory-mapped, an array or scipy.sparse CSR) in chunks of chunkRows
+#windows. chromCodes gives the chromosome number (0..chromCount-1) of every window. Returns the detections of every window
+#and the chromosome x NP detection totals, whose column sums are the detections of every NP
+def detectionTotals(detections, chromCodes, chromCount, chunkRows=summaryChunkRows):
+    windowCount, npCount = detections.shape
+    chromCodes = numpy.asarray(chromCodes)
+    windowSums = numpy.zeros(windowCount, dtype=numpy.int64)
+    chromNpSums = numpy.zeros((chromCount, npCount), dtype=numpy.int64)
+    for start in range(0, windowCount, chunkRows):
+        end = min(start + chunkRows, windowCount)
+        #chunk windows x chromosomes indicator, so the chromosome totals of the chunk are one product
+        indicator = scipy.sparse.csr_matrix((numpy.ones(end - start, dtype=numpy.int64), (numpy.arange(end - start), chromCodes[start:end])),
+                                            shape=(end - start, chromCount))
+        windowSums[start:end], chromSums = chunkSums(detections[start:end], indicator)
+        chromNpSums += chromSums.astype(numpy.int64)
+    return windowSums, chromNpSums
+
+#count, total, min, max, mean, standard deviation and percentiles of a vector of detection counts, as a Series
+def axisSummary(sums, percentiles=summaryPercentiles):
+    sums = numpy.asarray(sums)
+    if len(sums) == 0:
+        return pd.Series({'count': 0, 'total': 0}, dtype=numpy.float64)
+    summary = {'count': len(sums), 'total': sums.sum(), 'min': sums.min(), 'max': sums.max(), 'mean': sums.mean(), 'std': sums.std()}
+    summary.update({f'p{p:g}': v for p, v in zip(percentiles, numpy.percentile(sums, percentiles))})
+    return pd.Series(summary, dtype=numpy.float64)
+
+#Per chromosome: windows, detections, NPs detecting at least one of its windows, and the mean, min and max of the NPs
+#detecting each window and of the windows detected by each of those NPs
+def chromosomeSummary(chromNames, chromCodes, windowSums, chromNpSums):
+    chromCodes = numpy.asarray(chromCodes)
+    windows = numpy.bincount(chromCodes, minlength=len(chromNames))
+    detected = chromNpSums > 0
+    npCounts = detected.sum(axis=1)
+    windowDf = pd.DataFrame({'code': chromCodes, 'nps': windowSums}).groupby('code')['nps'].agg(['mean', 'min', 'max'])
+    windowDf = windowDf.reindex(range(len(chromNames)))
+    npMeans = numpy.divide(chromNpSums.sum(axis=1), npCounts, out=numpy.zeros(len(chromNames)), where=npCounts > 0)
+    npMins = numpy.where(detected, chromNpSums, numpy.iinfo(numpy.int64).max).min(axis=1, initial=numpy.iinfo(numpy.int64).max)
+    return pd.DataFrame({
+        'windows': windows,
+        'detections': chromNpSums.sum(axis=1),
+        'nps': npCounts,
+        'windowNpAvg': windowDf['mean'].to_numpy(),
+        'windowNpMin': windowDf['min'].to_numpy(),
+        'windowNpMax': windowDf['max'].to_numpy(),
+        'npWindowAvg': npMeans,
+        'npWindowMin': numpy.where(npCounts > 0, npMins, 0),
+        'npWindowMax': chromNpSums.max(axis=1, initial=0),
+    }, index=pd.Index(chromNames, name='chrom'))
+
+#Summary of a segmentation table (window table with a categorical chrom column and a windows x NPs detection matrix) in
+#one chunked pass over the detections. Returns a dict:
+#   windows, nps, detections   counts and the total of the detection matrix
+#   npSummary                  axisSummary of the windows detected by each NP
+#   windowSummary              axisSummary of the NPs detecting each window
+#   chromosomes                chromosomeSummary, one row per chromosome in file order
+#   npSums, windowSums         the detections of every NP (Series by NP name) and of every window
+def summarizeDetections(windowValuesDf, detections, npNames, percentiles=summaryPercentiles, chunkRows=summaryChunkRows):
+    #chromosomes numbered in order of first appearance, so the per-chromosome rows follow the file
+    chrom = numpy.asarray(windowValuesDf['chrom'].astype(str))
+    chroms = pd.Categorical(chrom, categories=pd.unique(chrom))
+    windowSums, chromNpSums = detectionTotals(detections, chroms.codes, len(chroms.categories), chunkRows)
+    npSums = chromNpSums.sum(axis=0)
+    return {
+        'windows': len(windowSums),
+        'nps': len(npNames),
+        'detections': int(windowSums.sum()),
+        'npSummary': axisSummary(npSums, percentiles),
+        'windowSummary': axisSummary(windowSums, percentiles),
+        'chromosomes': chromosomeSummary(list(chroms.categories), chroms.codes, windowSums, chromNpSums),
+        'npSums': pd.Series(npSums, index=npNames),
+        'windowSums': windowSums,
+    }
+
+#summarizeDetections of dataFile, read through its memory-mapped cache (or the sparse cache with sparse=True)
+def datasetSummary(dataFile, percentiles=summaryPercentiles, chunkRows=summaryChunkRows, sparse=False):
+    if sparse:
+        windowValuesDf, detections, npNames = gam_data.loadSparseSegmentationArrays(dataFile)
+        detections = detections.tocsr()
+    else:
+        windowValuesDf, detections, npNames = gam_data.loadSegmentationArrays(dataFile)
+    return summarizeDetections(windowValuesDf, detections, npNames, percentiles, chunkRows)
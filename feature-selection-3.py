@@ -1,29 +1,25 @@
 import numpy
 import math
 import pandas as pd
-import matplotlib.pyplot as plt
+import gam_data
+import feature_tracks
+from plotting import plt
 import hist1_analysis as h1_mod
-import seaborn as sns
 import random
 
 def main():
     #input data file
     dataFile = 'GSE64881_segmentation_at_30000bp.passqc.multibam.txt'
-    df = pd.read_csv(dataFile,sep='\t')
+    #windowValuesDf columns denote chromosome name and start and stop position, windowDetectionsDf columns denote an NP
+    #rows denote a window in both; loaded from a memory-mapped binary cache of dataFile
+    windowValuesDf, windowDetectionsDf = gam_data.loadSegmentationData(dataFile)
 
     featureFile = 'Hist1_region_features.csv'
-    featureDf = pd.read_csv(featureFile)
 
     #open output file
     outputFile = open("reports/feature-selection-3-report.md", 'w')
     outputFile.write('# Feature Selection 3 Report\n')
 
-    #columns denote an NP, rows denote a window
-    windowDetectionsDf = df.iloc[:,3:]
-
-    #columns denote chromosome name and start and stop position, rows denote a window
-    windowValuesDf = df.iloc[:,0:3]
-
     #extract Hist1 windows and NPs
     hist1Windows = h1_mod.findHist1Windows(windowValuesDf)
     hist1WindowDetectionsDf = windowDetectionsDf.iloc[hist1Windows,:]
@@ -31,15 +27,14 @@ def main():
     hist1NpSums = h1_mod.windowsPerNP(hist1WindowDetectionsDf)
     hist1NPs = list(hist1NpSums.index)
 
-    #change indices of featureDf to be the same as windowValuesDf
-    featureDf = featureDf.set_index(hist1WindowValuesDf.index)
+    #feature annotations of the Hist1 windows, joined on their coordinates
+    featureDf = feature_tracks.regionFeatures(featureFile, hist1WindowValuesDf)
 
     #Find radial positions of all NPs
     npRadialPositions = h1_mod.findNpRadialPositions(windowDetectionsDf)
 
     #construct a matrix of Jaccard Indices for each pair of NPs
-    jaccardData = [[h1_mod.normalizedJaccard(a,b,hist1WindowDetectionsDf) for a in hist1NPs] for b in hist1NPs]
-    npJaccards = pd.DataFrame(data=jaccardData, index=hist1NPs, columns=hist1NPs)
+    npJaccards = h1_mod.jaccardMatrices(hist1WindowDetectionsDf, hist1NPs)['normalizedJaccard']
 
     #run k-means clustering
     startingMedoids = [['F15B5', 'F15F3', 'F11D4'],['F6A4', 'F9A2', 'F7F3'],['F12B2', 'F7F3', 'F16F4']]#similarity,distance,balance
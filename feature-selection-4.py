@@ -1,31 +1,26 @@
 import numpy
 import math
 import pandas as pd
-import matplotlib.pyplot as plt
+import gam_data
+import feature_tracks
+from plotting import plt, go
 import hist1_analysis as h1_mod
-import seaborn as sns
+import permutation_tests
 import random
-import plotly.express as px
-import plotly.graph_objects as go
 
 def main():
     #input data file
     dataFile = 'GSE64881_segmentation_at_30000bp.passqc.multibam.txt'
-    df = pd.read_csv(dataFile,sep='\t')
+    #windowValuesDf columns denote chromosome name and start and stop position, windowDetectionsDf columns denote an NP
+    #rows denote a window in both; loaded from a memory-mapped binary cache of dataFile
+    windowValuesDf, windowDetectionsDf = gam_data.loadSegmentationData(dataFile)
 
     featureFile = 'Hist1_region_features.csv'
-    featureDf = pd.read_csv(featureFile)
 
     #open output file
     outputFile = open("reports/feature-selection-4-report.md", 'w')
     outputFile.write('# Feature Selection 4 Report\n')
 
-    #columns denote an NP, rows denote a window
-    windowDetectionsDf = df.iloc[:,3:]
-
-    #columns denote chromosome name and start and stop position, rows denote a window
-    windowValuesDf = df.iloc[:,0:3]
-
     #extract Hist1 windows and NPs
     hist1Windows = h1_mod.findHist1Windows(windowValuesDf)
     hist1WindowDetectionsDf = windowDetectionsDf.iloc[hist1Windows,:]
@@ -33,15 +28,18 @@ def main():
     hist1NpSums = h1_mod.windowsPerNP(hist1WindowDetectionsDf)
     hist1NPs = list(hist1NpSums.index)
 
-    #change indices of featureDf to be the same as windowValuesDf
-    featureDf = featureDf.set_index(hist1WindowValuesDf.index)
+    #feature annotations of the Hist1 windows, joined on their coordinates
+    featureDf = feature_tracks.regionFeatures(featureFile, hist1WindowValuesDf)
 
     #Find radial positions of all NPs
     npRadialPositions = h1_mod.findNpRadialPositions(windowDetectionsDf)
 
     #construct a matrix of Jaccard Indices for each pair of NPs
-    jaccardData = [[h1_mod.normalizedJaccard(a,b,hist1WindowDetectionsDf) for a in hist1NPs] for b in hist1NPs]
-    npJaccards = pd.DataFrame(data=jaccardData, index=hist1NPs, columns=hist1NPs)
+    npJaccards = h1_mod.jaccardMatrices(hist1WindowDetectionsDf, hist1NPs)['normalizedJaccard']
+
+    #find for each NP the percentage of its windows with each feature, once for every clustering
+    features = ['Hist1','Vmn','LAD','RNAPII-S2P','RNAPII-S5P','RNAPII-S7P','Enhancer','H3K9me3','H3K20me3','h3k27me3','H3K36me3','NANOG','pou5f1','sox2','CTCF-7BWU']
+    npFeatureDf = h1_mod.npFeaturePercentages(hist1WindowDetectionsDf, featureDf, features)
 
     #use three groups of starting medoids
     startingMedoids = [['F15B5', 'F15F3', 'F11D4'],['F6A4', 'F9A2', 'F7F3'],['F12B2', 'F7F3', 'F16F4']]#found testing 10000 combinations
@@ -52,73 +50,80 @@ def main():
         'Balance between intra-cluster similarity and inter-cluster distance'
     ]
 
-    #process each medoid group
-    for medoids,title,desc in zip(startingMedoids,clusteringTitles,clusteringDescs):
-        #run k-medoids clustering
-        clusters,clusterMedoids = h1_mod.runKMedoidsClustering(medoids,hist1NPs,npJaccards)
-        clusterScore = h1_mod.assignClusteringScores(clusters,clusterMedoids,npJaccards)['similarityAvg']
-
-        #For each cluster, find the average percentage of windows with each feature across each NP
-        features = ['Hist1','Vmn','LAD','RNAPII-S2P','RNAPII-S5P','RNAPII-S7P','Enhancer','H3K9me3','H3K20me3','h3k27me3','H3K36me3','NANOG','pou5f1','sox2','CTCF-7BWU']
-        clusterFeaturePercentages = [{f: 0 for f in features} for c in clusters]
-        for i,c in zip(clusterFeaturePercentages,clusters):
-            for f in features:
-                npPercentages = [100*sum(hist1WindowDetectionsDf[np] & featureDf[f])/sum(hist1WindowDetectionsDf[np]) for np in c]
-                i[f] = sum(npPercentages)/len(c)
-
-        #Find the percentage of hist1 genes with each feature
-        histFeaturePercentages = {f:100*featureDf[f].astype(bool).sum()/len(list(featureDf[f])) for f in features}
-
-        #Make a radar chart
-        fig = go.Figure()
-
-        for i,(cfp,med) in enumerate(zip(clusterFeaturePercentages,clusterMedoids)):
-            df = pd.DataFrame([[f,cfp[f]] for f in features])
+    #one pool of workers for the permutation tests of every clustering, shut down however the loop ends
+    with permutation_tests.permutationPool() as permutationPool:
+        #process each medoid group
+        for medoids,title,desc in zip(startingMedoids,clusteringTitles,clusteringDescs):
+            #run k-medoids clustering
+            clusters,clusterMedoids = h1_mod.runKMedoidsClustering(medoids,hist1NPs,npJaccards)
+            clusterScore = h1_mod.assignClusteringScores(clusters,clusterMedoids,npJaccards)['similarityAvg']
+
+            #For each cluster, find the average percentage of windows with each feature across each NP
+            labels = h1_mod.clusterLabels(clusters)
+            clusterFeatureDf = h1_mod.clusterFeatureEnrichment(npFeatureDf, labels).reindex(range(len(clusters)))
+            clusterFeaturePercentages = [clusterFeatureDf.loc[i] for i in range(len(clusters))]
+
+            #significance of each cluster's feature percentages against 1000 random reassignments of the NPs to clusters
+            significance = permutation_tests.permutationTest((featureDf[features] != 0).to_numpy(), labels.to_numpy(), features,
+                                                             weights=h1_mod.detectionMatrix(hist1WindowDetectionsDf[labels.index]),
+                                                             permutations=1000, seed=random.randrange(2**32), pool=permutationPool)
+
+            #Find the percentage of hist1 genes with each feature
+            histFeaturePercentages = {f:100*featureDf[f].astype(bool).sum()/len(list(featureDf[f])) for f in features}
+
+            #Make a radar chart
+            fig = go.Figure()
+
+            for i,(cfp,med) in enumerate(zip(clusterFeaturePercentages,clusterMedoids)):
+                df = pd.DataFrame([[f,cfp[f]] for f in features])
+                fig.add_trace(go.Scatterpolar(
+                    r=df[1],
+                    theta=df[0],
+                    fill='toself',
+                    name='Cluster ' + str(i) + ': ' + med,
+                ))
+            df = pd.DataFrame([[f,histFeaturePercentages[f]] for f in features])
             fig.add_trace(go.Scatterpolar(
                 r=df[1],
                 theta=df[0],
-                fill='toself',
-                name='Cluster ' + str(i) + ': ' + med,
+                name='Hist1 Full Average',
+                mode='markers'
             ))
-        df = pd.DataFrame([[f,histFeaturePercentages[f]] for f in features])
-        fig.add_trace(go.Scatterpolar(
-            r=df[1],
-            theta=df[0],
-            name='Hist1 Full Average',
-            mode='markers'
-        ))
         
-        #output to file
-        fig.write_image(file='charts/feature-selection-4/' + title + '-radar.png',format='png')
-        fig.write_html(file='charts/feature-selection-4/' + title + '-radar.html')
-        outputFile.write('## ' + desc + '\n\n')
-        outputFile.write('![Radar graph](../charts/feature-selection-4/' + title + '-radar.png)\n\n')
-        outputFile.write('Cluster medoids: ' + str(clusterMedoids) + '\n\n')
-        outputFile.write('Average similarity of each NP to its medoid: ' + str(clusterScore) + '\n\n')
-        outputFile.write('Size of each cluster: ' + str([len(c) for c in clusters]) + '\n\n')
-
-        #for each cluster, find the amount of NPs with each radial position
-        radialPositionCounts = [{1:0, 2:0, 3:0, 4:0, 5:0} for x in [0,1,2]]
-        for c, count in zip(clusters,radialPositionCounts):
-            for np in c:
-                count[npRadialPositions[np]] += 1
-
-        for i in [0,1,2]:
-            plt.figure()
-            plt.bar([1,2,3,4,5],list(radialPositionCounts[i].values()))
-            plt.title('Cluster ' + str(i) + ' NP radial positions')
-            plt.xlabel('Radial positions (Apical - Equitorial)')
-            plt.ylabel('NPs in each radial position')
-            saveFile = 'charts/feature-selection-4/' + title + '-cluster-' + str(i) + '-radial-counts.png'
-            plt.savefig(saveFile)
-            outputFile.write('![Cluster ' + str(i) + ' radial positions](../' + saveFile + ')\n\n')
-
+            #output to file
+            fig.write_image(file='charts/feature-selection-4/' + title + '-radar.png',format='png')
+            fig.write_html(file='charts/feature-selection-4/' + title + '-radar.html')
+            outputFile.write('## ' + desc + '\n\n')
+            outputFile.write('![Radar graph](../charts/feature-selection-4/' + title + '-radar.png)\n\n')
+            outputFile.write('Cluster medoids: ' + str(clusterMedoids) + '\n\n')
+            outputFile.write('Average similarity of each NP to its medoid: ' + str(clusterScore) + '\n\n')
+            outputFile.write('Size of each cluster: ' + str([len(c) for c in clusters]) + '\n\n')
+
+            #table of z-scores and two-sided permutation p-values of each cluster and feature
+            outputFile.write('Z-score (p-value) of the average feature percentage of each cluster, against 1000 random reassignments of the NPs to clusters:\n\n')
+            outputFile.write('| Cluster | ' + ' | '.join(features) + ' |\n|' + ' --- |' * (len(features) + 1) + '\n')
+            for i in range(len(clusters)):
+                cells = [f"{significance['zScore'].loc[i,f]:.2f} ({significance['pValue'].loc[i,f]:.3f})" for f in features]
+                outputFile.write('| ' + str(i) + ' | ' + ' | '.join(cells) + ' |\n')
+            outputFile.write('\n')
+
+            #for each cluster, find the amount of NPs with each radial position
+            radialPositionCounts = [{1:0, 2:0, 3:0, 4:0, 5:0} for x in [0,1,2]]
+            for c, count in zip(clusters,radialPositionCounts):
+                for np in c:
+                    count[npRadialPositions[np]] += 1
+
+            for i in [0,1,2]:
+                plt.figure()
+                plt.bar([1,2,3,4,5],list(radialPositionCounts[i].values()))
+                plt.title('Cluster ' + str(i) + ' NP radial positions')
+                plt.xlabel('Radial positions (Apical - Equitorial)')
+                plt.ylabel('NPs in each radial position')
+                saveFile = 'charts/feature-selection-4/' + title + '-cluster-' + str(i) + '-radial-counts.png'
+                plt.savefig(saveFile)
+                outputFile.write('![Cluster ' + str(i) + ' radial positions](../' + saveFile + ')\n\n')
 
     return 
 
-def clusterDistanceScore(clusters,clusterMedoids,npJaccards):
-    distances = sum([sum([sum([(1-npJaccards[np][clusterMedoids[(i+x)%3]]) for x in [1,2]]) for np in c]) for i,c in enumerate(clusters)])
-    return distances/(2*sum([len(c) for c in clusters]))
-
 if __name__ == "__main__":
     main()
@@ -1,26 +1,23 @@
 import numpy
 import math
 import pandas as pd
-import matplotlib.pyplot as plt
+import gam_data
+from plotting import plt, sns
 import hist1_analysis as h1_mod
-import seaborn as sns
 import random
+import kmedoids
 
 def main():
     #input data file
     dataFile = 'GSE64881_segmentation_at_30000bp.passqc.multibam.txt'
-    df = pd.read_csv(dataFile,sep='\t')
+    #windowValuesDf columns denote chromosome name and start and stop position, windowDetectionsDf columns denote an NP
+    #rows denote a window in both; loaded from a memory-mapped binary cache of dataFile
+    windowValuesDf, windowDetectionsDf = gam_data.loadSegmentationData(dataFile)
 
     #open output file
     outputFile = open("reports/feature-selection-report.md", 'w')
     outputFile.write('# Feature Selection Report\n')
 
-    #columns denote an NP, rows denote a window
-    windowDetectionsDf = df.iloc[:,3:]
-
-    #columns denote chromosome name and start and stop position, rows denote a window
-    windowValuesDf = df.iloc[:,0:3]
-
     #extract Hist1 windows and NPs
     hist1Windows = h1_mod.findHist1Windows(windowValuesDf)
     hist1WindowDetectionsDf = windowDetectionsDf.iloc[hist1Windows,:]
@@ -28,60 +25,35 @@ def main():
     hist1NPs = list(hist1NpSums.index)
 
     #construct a matrix of Jaccard Indices for each pair of NPs
-    jaccardData = [[h1_mod.normalizedJaccard(a,b,hist1WindowDetectionsDf) for a in hist1NPs] for b in hist1NPs]
-    npJaccards = pd.DataFrame(data=jaccardData, index=hist1NPs, columns=hist1NPs)
-
-    #Run K-medoids clustering
-    npCombos = []
-    for x in range(0,len(hist1NPs)):
-        for y in range(x+1,len(hist1NPs)):
-            for z in range(y+1,len(hist1NPs)):
-                npCombos.append([hist1NPs[x],hist1NPs[y],hist1NPs[z]])
-    
+    npJaccards = h1_mod.jaccardMatrices(hist1WindowDetectionsDf, hist1NPs)['normalizedJaccard']
+
+    #Run K-medoids clustering, starting from distinct random combinations of 3 NPs
     clusteringAmount = 10000
-    selectCombos = random.sample(npCombos,clusteringAmount)
-    clusteringScores = []
-
-    maxScore = {'similarityAvg': 0}
-    optimalSimClustering = []
-    optimalSimMedoids = []
-
-    optimalDistClustering = []
-    optimalDistMedoids = []
-    maxDist = {'interClusterDistanceAvg': 0}
-
-    balanceScore = {}
-    minBalanceDist = 2
-    optimalBalanceClustering = []
-    optimalBalanceMedoids = []
-
-    for i in selectCombos:
-        print(i,end=' ')
-        clusters, clusterMedoids = runKMedoidsClustering(i,hist1NPs,npJaccards)
-        clusteringScore = assignClusteringScores(clusters,clusterMedoids,npJaccards)
-        clusteringScores.append(clusteringScore)
-        print(clusteringScore['similarityAvg'],len(clusteringScores))
-        if clusteringScore['similarityAvg'] > maxScore['similarityAvg']:
-            maxScore = clusteringScore
-            optimalSimClustering = clusters
-            optimalSimMedoids = clusterMedoids
-        if clusteringScore['interClusterDistanceAvg'] > maxDist['interClusterDistanceAvg']:
-            maxDist = clusteringScore
-            optimalDistClustering = clusters
-            optimalDistMedoids = clusterMedoids
-        balanceDist = math.sqrt(math.pow(1-clusteringScore['similarityAvg'],2) + math.pow(1-clusteringScore['interClusterDistanceAvg'],2))
-        if balanceDist < minBalanceDist:
-            minBalanceDist = balanceDist
-            balanceScore = clusteringScore
-            optimalBalanceClustering = clusters
-            optimalBalanceMedoids = clusterMedoids
+
+    #run every clustering across a pool of worker processes, keeping the best clustering by each criterion
+    searchResults = kmedoids.multiStartSearch(npJaccards.to_numpy(), 3, clusteringAmount, seed=random.randrange(2**32),
+                                              keepScores=True, distinctStarts=True)
+    #one row per clustering: intra-cluster similarity average, inter-cluster distance average
+    clusteringScores = searchResults['scores']
+
+    maxScore = searchResults['similarity']
+    optimalSimClustering = kmedoids.labelsToClusters(maxScore['labels'], hist1NPs, 3)
+    optimalSimMedoids = [hist1NPs[m] for m in maxScore['medoids']]
+
+    maxDist = searchResults['distance']
+    optimalDistClustering = kmedoids.labelsToClusters(maxDist['labels'], hist1NPs, 3)
+    optimalDistMedoids = [hist1NPs[m] for m in maxDist['medoids']]
+
+    balanceScore = searchResults['balance']
+    optimalBalanceClustering = kmedoids.labelsToClusters(balanceScore['labels'], hist1NPs, 3)
+    optimalBalanceMedoids = [hist1NPs[m] for m in balanceScore['medoids']]
     
     plt.figure()
     plt.title('Cluster scores')
     plt.xlabel('Inter-cluster distance averages')
     plt.ylabel('Intra-cluster similarity averages')
-    plt.scatter(list(map(lambda x: x['interClusterDistanceAvg'], clusteringScores)),list(map(lambda x: x['similarityAvg'], clusteringScores)))
-    # plt.scatter(range(0,len(selectCombos)),list(map(lambda x: x['similarityAvg'], clusteringScores)))
+    plt.scatter(clusteringScores[:,1],clusteringScores[:,0])
+    # plt.scatter(range(0,len(clusteringScores)),clusteringScores[:,0])
     saveToFile = 'charts/feature-selection/similarity-averages.png'
     plt.savefig(saveToFile)
     outputFile.write('![Intra-cluster similarity averages](../' + saveToFile + ')\n\n')
@@ -121,38 +93,5 @@ def main():
     return 
 
 
-def assignClusteringScores(clusters,clusterMedoids,npJaccards):
-    npAmount = sum([len(c) for c in clusters])
-    scores = {
-        'similaritySum': sum([sum([npJaccards[np][med] for np in c]) for c,med in zip(clusters,clusterMedoids)]),
-        'similarityAvg': sum([sum([npJaccards[np][med] for np in c]) for c,med in zip(clusters,clusterMedoids)])/npAmount,
-        'distanceSum': sum([sum([1-npJaccards[np][med] for np in c]) for c,med in zip(clusters,clusterMedoids)]),
-        'distanceAvg': sum([sum([1-npJaccards[np][med] for np in c]) for c,med in zip(clusters,clusterMedoids)])/npAmount,
-        'interClusterDistanceAvg': sum([sum([sum([(1-npJaccards[np][clusterMedoids[(i+x)%3]]) for x in [1,2]]) for np in c]) for i,c in enumerate(clusters)])/(2*npAmount)
-    }
-    return scores
-
-
-#performs K-Medoids clustering on values in hist1NPs, with similarities denoted in npJaccards, starting with clusterMedoids medoids
-#returns clusters and clusterMedoids
-def runKMedoidsClustering(clusterMedoids, hist1NPs, npJaccards):
-    clusterPreferences = [random.randint(0,3) for x in hist1NPs]
-        #An arbitrary preference of which cluster to be assigned to in case of a tie
-    clusterAssignments = h1_mod.assignKMeansCluster(hist1NPs, clusterMedoids, npJaccards, clusterPreferences)
-    clusters = h1_mod.arrangeClusters(clusterAssignments, 3)
-    running = True
-    iterations = 1
-    while (running):
-        clusterMedoids = [h1_mod.findClusterMedoid(c,npJaccards) for c in clusters]
-        nextAssignments = h1_mod.assignKMeansCluster(hist1NPs, clusterMedoids, npJaccards, clusterPreferences)
-        nextClusters = h1_mod.arrangeClusters(clusterAssignments,3)
-        if (nextAssignments == clusterAssignments):
-            running = False
-        clusterAssignments = nextAssignments
-        clusters = nextClusters
-        iterations += 1
-
-    return clusters, clusterMedoids
-
 if __name__ == "__main__":
     main()
@@ -0,0 +1,103 @@
+import os
+import numpy
+import pandas as pd
+
+#columns of a window table or feature table that hold coordinates rather than features
+coordinateColumns = ['name', 'chrom', 'start', 'stop', 'end']
+
+#Read a BED-like annotation file: chrom, start, end and an optional feature name per line ('#', 'track' and 'browser'
+#lines skipped). Lines without a name belong to the feature named after the file. Returns a DataFrame of intervals
+#with columns chrom, start, end and feature
+def readFeatureBed(bedFile):
+    defaultFeature = os.path.splitext(os.path.basename(bedFile))[0]
+    rows = []
+    with open(bedFile) as f:
+        for line in f:
+            fields = line.strip().split()
+            if not fields or fields[0].startswith('#') or fields[0] in ('track', 'browser'):
+                continue
+            rows.append((fields[0], int(fields[1]), int(fields[2]), fields[3] if len(fields) > 3 else defaultFeature))
+    return pd.DataFrame(rows, columns=['chrom', 'start', 'end', 'feature'])
+
+#Intervals of a window x feature table with chrom, start and stop columns (like Hist1_region_features.csv): every window
+#with a non-zero value of a feature becomes an interval of that feature. Returns the columns of readFeatureBed
+def featureTableIntervals(featureTableDf):
+    features = [c for c in featureTableDf.columns if c not in coordinateColumns]
+    values = featureTableDf[features].to_numpy()
+    rows, columns = numpy.nonzero(values != 0)
+    return pd.DataFrame({
+        'chrom': featureTableDf['chrom'].astype(str).to_numpy()[rows],
+        'start': featureTableDf['start'].to_numpy()[rows],
+        'end': featureTableDf['stop'].to_numpy()[rows],
+        'feature': numpy.asarray(features, dtype=object)[columns],
+    })
+
+#Interval index over genome-wide feature annotations (columns chrom, start, end, feature; half-open like BED). The starts
+#and the ends of every feature on every chromosome are sorted separately, so the intervals overlapping a window are
+#counted with two binary searches: those starting before the window ends minus those ending before it starts
+class FeatureIndex:
+
+    def __init__(self, intervalsDf, features=None):
+        chroms = intervalsDf['chrom'].astype(str).to_numpy()
+        starts = numpy.asarray(intervalsDf['start'], dtype=numpy.int64)
+        ends = numpy.asarray(intervalsDf['end'], dtype=numpy.int64)
+        featureNames = intervalsDf['feature'].astype(str).to_numpy()
+        #features in order of first appearance unless given
+        self.features = list(features) if features is not None else list(pd.unique(featureNames))
+        self.chromosomes = {}
+        for (chrom, feature), rows in pd.Series(numpy.arange(len(chroms))).groupby([chroms, featureNames]).groups.items():
+            if feature in self.features:
+                rows = numpy.asarray(rows)
+                self.chromosomes.setdefault(chrom, {})[feature] = (numpy.sort(starts[rows]), numpy.sort(ends[rows]))
+
+    #Returns a windows x features array of the number of intervals of each feature overlapping each window
+    #chroms, starts and stops give the windows; every (chromosome, feature) pair is one vectorized sweep over its windows
+    def overlapCounts(self, chroms, starts, stops):
+        chroms = numpy.asarray(chroms).astype(str)
+        starts = numpy.asarray(starts, dtype=numpy.int64)
+        stops = numpy.asarray(stops, dtype=numpy.int64)
+        counts = numpy.zeros((len(chroms), len(self.features)), dtype=numpy.int64)
+        columns = {feature: i for i, feature in enumerate(self.features)}
+        for chrom in numpy.unique(chroms):
+            if chrom not in self.chromosomes:
+                continue
+            rows = numpy.flatnonzero(chroms == chrom)
+            for feature, (featureStarts, featureEnds) in self.chromosomes[chrom].items():
+                counts[rows, columns[feature]] = (numpy.searchsorted(featureStarts, stops[rows], side='left') -
+                                                   numpy.searchsorted(featureEnds, starts[rows], side='right'))
+        return counts
+
+    #Window x feature DataFrame for the windows of a window table (columns chrom, start, stop) with its index
+    #Values are 1 when a window overlaps any interval of the feature and 0 otherwise, or the interval counts with counts=True
+    def annotate(self, windowValuesDf, counts=False):
+        overlaps = self.overlapCounts(windowValuesDf['chrom'], windowValuesDf['start'], windowValuesDf['stop'])
+        if not counts:
+            overlaps = (overlaps > 0).astype(int)
+        return pd.DataFrame(overlaps, index=windowValuesDf.index, columns=self.features)
+
+#Build a FeatureIndex from one or more annotation files: BED files (see readFeatureBed) or window x feature CSV tables
+#with chrom, start and stop columns (see featureTableIntervals). Load it once and annotate any region with it
+def loadFeatureTracks(featureFiles, features=None):
+    if isinstance(featureFiles, str):
+        featureFiles = [featureFiles]
+    intervals = []
+    for featureFile in featureFiles:
+        if featureFile.endswith('.csv'):
+            intervals.append(featureTableIntervals(pd.read_csv(featureFile)))
+        else:
+            intervals.append(readFeatureBed(featureFile))
+    return FeatureIndex(pd.concat(intervals, ignore_index=True), features)
+
+#Feature annotations of the windows of windowValuesDf (columns chrom, start, stop) from featureFile, indexed like
+#windowValuesDf and with the feature columns in file order. Tables and BED files with coordinates are joined by
+#coordinates. A table without coordinates can only be matched row by row, so it must have one row per window
+def regionFeatures(featureFile, windowValuesDf):
+    if featureFile.endswith('.csv'):
+        featureTableDf = pd.read_csv(featureFile)
+        if not {'chrom', 'start', 'stop'}.issubset(featureTableDf.columns):
+            if len(featureTableDf) != len(windowValuesDf):
+                raise ValueError(f'{featureFile} has no chrom, start and stop columns and {len(featureTableDf)} rows for {len(windowValuesDf)} windows')
+            return featureTableDf.set_index(windowValuesDf.index)
+        features = [c for c in featureTableDf.columns if c not in coordinateColumns]
+        return FeatureIndex(featureTableIntervals(featureTableDf), features).annotate(windowValuesDf)
+    return loadFeatureTracks(featureFile).annotate(windowValuesDf)
@@ -0,0 +1,133 @@
+import os
+import json
+import weakref
+import numpy
+import pandas as pd
+
+#number of text rows parsed at a time while building the cache
+chunkRows = 20000
+
+#returns the directory holding the binary cache of dataFile
+def cacheDirectory(dataFile):
+    return dataFile + '.cache'
+
+#size and modification time of the source file, stored with the cache to detect when it is stale
+def sourceSignature(dataFile):
+    stat = os.stat(dataFile)
+    return {'size': stat.st_size, 'mtime': stat.st_mtime_ns}
+
+#True if the cache of dataFile exists and was built from the current version of the file
+def cacheIsCurrent(dataFile):
+    metaFile = os.path.join(cacheDirectory(dataFile), 'meta.json')
+    if not os.path.exists(metaFile):
+        return False
+    with open(metaFile) as f:
+        meta = json.load(f)
+    return meta.get('source') == sourceSignature(dataFile)
+
+#Parse the tab separated segmentation table once and write it as a binary cache:
+#   windows.npz     chromosome codes and names, window starts and stops, NP names
+#   detections.npy  uint8 matrix, rows denote a window, columns denote an NP
+#   meta.json       size and mtime of the source file, written last so a half built cache is never used
+def buildCache(dataFile):
+    cacheDir = cacheDirectory(dataFile)
+    os.makedirs(cacheDir, exist_ok=True)
+    metaFile = os.path.join(cacheDir, 'meta.json')
+    for staleFile in [metaFile, os.path.join(cacheDir, 'detections-csc.npz')]:
+        if os.path.exists(staleFile):
+            os.remove(staleFile)
+    signature = sourceSignature(dataFile)
+
+    columns = list(pd.read_csv(dataFile, sep='\t', nrows=0).columns)
+    npNames = columns[3:]
+    with open(dataFile, 'rb') as f:
+        windowCount = sum(1 for line in f) - 1
+
+    detections = numpy.lib.format.open_memmap(os.path.join(cacheDir, 'detections.npy'), mode='w+',
+                                              dtype=numpy.uint8, shape=(windowCount, len(npNames)))
+    chromCodes = numpy.zeros(windowCount, dtype=numpy.int32)
+    starts = numpy.zeros(windowCount, dtype=numpy.int64)
+    stops = numpy.zeros(windowCount, dtype=numpy.int64)
+    chromNames = []
+
+    dtypes = {c: numpy.uint8 for c in npNames}
+    dtypes.update({'chrom': str, 'start': numpy.int64, 'stop': numpy.int64})
+    row = 0
+    for chunk in pd.read_csv(dataFile, sep='\t', dtype=dtypes, chunksize=chunkRows):
+        end = row + len(chunk)
+        for chrom in pd.unique(chunk['chrom']):
+            if chrom not in chromNames:
+                chromNames.append(chrom)
+        chromCodes[row:end] = pd.Categorical(chunk['chrom'], categories=chromNames).codes
+        starts[row:end] = chunk['start'].to_numpy()
+        stops[row:end] = chunk['stop'].to_numpy()
+        detections[row:end, :] = chunk.iloc[:, 3:].to_numpy(dtype=numpy.uint8)
+        row = end
+    detections.flush()
+    del detections
+
+    numpy.savez(os.path.join(cacheDir, 'windows.npz'), chromCodes=chromCodes, chromNames=numpy.array(chromNames),
+                starts=starts, stops=stops, npNames=numpy.array(npNames))
+    with open(metaFile, 'w') as f:
+        json.dump({'source': signature, 'windows': windowCount, 'nps': len(npNames)}, f)
+
+#Returns the window coordinates as a DataFrame (chrom, start, stop), the memory-mapped uint8 detection
+#matrix (windows x NPs) and the list of NP names. The cache is (re)built when the source file has changed
+def loadSegmentationArrays(dataFile):
+    if not cacheIsCurrent(dataFile):
+        buildCache(dataFile)
+    cacheDir = cacheDirectory(dataFile)
+    with numpy.load(os.path.join(cacheDir, 'windows.npz')) as windows:
+        chroms = pd.Categorical.from_codes(windows['chromCodes'], categories=windows['chromNames'].tolist())
+        windowValuesDf = pd.DataFrame({'chrom': chroms, 'start': windows['starts'], 'stop': windows['stops']})
+        npNames = windows['npNames'].tolist()
+    detections = numpy.load(os.path.join(cacheDir, 'detections.npy'), mmap_mode='r')
+    return windowValuesDf, detections, npNames
+
+#Returns windowValuesDf (columns denote chromosome name and start and stop position, rows denote a window) and
+#windowDetectionsDf (columns denote an NP, rows denote a window), backed by the memory-mapped cache
+def loadSegmentationData(dataFile):
+    windowValuesDf, detections, npNames = loadSegmentationArrays(dataFile)
+    windowDetectionsDf = pd.DataFrame(detections, columns=npNames, copy=False)
+    return windowValuesDf, windowDetectionsDf
+
+#Returns the window coordinates, the detection matrix as a scipy.sparse CSC matrix (windows x NPs) and the NP names
+#The sparse matrix is built from the dense cache in chunks of rows the first time and cached as detections-csc.npz
+def loadSparseSegmentationArrays(dataFile):
+    import scipy.sparse
+    windowValuesDf, detections, npNames = loadSegmentationArrays(dataFile)
+    sparseFile = os.path.join(cacheDirectory(dataFile), 'detections-csc.npz')
+    if os.path.exists(sparseFile):
+        matrix = scipy.sparse.load_npz(sparseFile)
+    else:
+        chunks = [scipy.sparse.csr_matrix(numpy.asarray(detections[start:start+chunkRows])) for start in range(0, detections.shape[0], chunkRows)]
+        matrix = scipy.sparse.vstack(chunks, format='csc', dtype=numpy.uint8)
+        scipy.sparse.save_npz(sparseFile, matrix)
+    return windowValuesDf, matrix, npNames
+
+#float64 CSR detection matrices of sparse detection tables, by id of the table; an entry is dropped when its table is
+#garbage collected, before the id can be reused
+sparseMatrixCache = {}
+
+#Remember matrix (windows x NPs) as the detection matrix of the sparse table windowDetectionsDf
+def registerSparseMatrix(windowDetectionsDf, matrix):
+    key = id(windowDetectionsDf)
+    sparseMatrixCache[key] = matrix.tocsr().astype(numpy.float64)
+    weakref.finalize(windowDetectionsDf, sparseMatrixCache.pop, key, None)
+
+#The float64 CSR detection matrix of a sparse table (see loadSparseSegmentationData), converted from its sparse columns
+#only the first time; later calls on the same table return the cached matrix, which must not be modified
+def sparseDetectionMatrix(windowDetectionsDf):
+    key = id(windowDetectionsDf)
+    if key not in sparseMatrixCache:
+        registerSparseMatrix(windowDetectionsDf, windowDetectionsDf.sparse.to_coo())
+    return sparseMatrixCache[key]
+
+#Like loadSegmentationData, but windowDetectionsDf holds sparse columns that only store the detected windows of each NP
+#Values are stored as int32 so pandas sums over a column cannot overflow. The CSR matrix of the table is cached right
+#away, so sparseDetectionMatrix never converts the full table
+def loadSparseSegmentationData(dataFile):
+    windowValuesDf, matrix, npNames = loadSparseSegmentationArrays(dataFile)
+    windowDetectionsDf = pd.DataFrame.sparse.from_spmatrix(matrix.astype(numpy.int32), columns=npNames)
+    registerSparseMatrix(windowDetectionsDf, matrix)
+    return windowValuesDf, windowDetectionsDf
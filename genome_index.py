@@ -0,0 +1,76 @@
+import re
+import numpy
+
+#the Hist1 region: mouse chromosome 13 between 21.7 and 24.1 Mb
+hist1Region = ('chr13', 21700000, 24100000)
+
+#Convert 'chrom:start-end' (commas allowed in the numbers) or a (chrom, start, end) tuple to a (chrom, start, end) tuple
+def parseRegion(region):
+    if isinstance(region, str):
+        match = re.fullmatch(r'\s*([^:\s]+):([\d,]+)-([\d,]+)\s*', region)
+        if match is None:
+            raise ValueError('region must look like chrom:start-end, got ' + region)
+        return match.group(1), int(match.group(2).replace(',', '')), int(match.group(3).replace(',', ''))
+    chrom, start, end = region
+    return chrom, int(start), int(end)
+
+#Interval index over the window table (columns chrom, start, stop): the windows of each chromosome are sorted by start
+#and binary searched, so the windows of any region are found in O(log n) instead of scanning every window
+class WindowIndex:
+
+    def __init__(self, windowValuesDf):
+        chroms = numpy.asarray(windowValuesDf['chrom'].astype(str))
+        starts = numpy.asarray(windowValuesDf['start'], dtype=numpy.int64)
+        stops = numpy.asarray(windowValuesDf['stop'], dtype=numpy.int64)
+        order = numpy.lexsort((starts, chroms))
+        sortedChroms = chroms[order]
+        bounds = numpy.flatnonzero(sortedChroms[1:] != sortedChroms[:-1]) + 1
+        self.chromosomes = {}
+        for first, last in zip(numpy.r_[0, bounds], numpy.r_[bounds, len(order)]):
+            rows = order[first:last]
+            #running maximum of the stops, so windows overlapping a position are never skipped by the search
+            self.chromosomes[sortedChroms[first]] = (starts[rows], stops[rows], numpy.maximum.accumulate(stops[rows]), rows)
+
+    #Returns the positional row numbers, in genomic order, of the windows in chrom between start and end
+    #With contained=False windows overlapping the region are returned, otherwise only windows inside it
+    def query(self, chrom, start, end, contained=False):
+        if chrom not in self.chromosomes:
+            return numpy.zeros(0, dtype=numpy.int64)
+        starts, stops, maxStops, rows = self.chromosomes[chrom]
+        first = numpy.searchsorted(maxStops, start, side='right')
+        last = numpy.searchsorted(starts, end, side='left')
+        candidates = slice(first, max(first, last))
+        if contained:
+            keep = (starts[candidates] >= start) & (stops[candidates] <= end)
+        else:
+            keep = stops[candidates] > start
+        return rows[candidates][keep]
+
+    #Returns the windows of a region given as 'chrom:start-end' or a (chrom, start, end) tuple
+    def queryRegion(self, region, contained=False):
+        chrom, start, end = parseRegion(region)
+        return self.query(chrom, start, end, contained)
+
+    #Returns the windows of many regions at once; the binary searches of each chromosome run as one vectorized call
+    def queryMany(self, regions, contained=False):
+        parsed = [parseRegion(r) for r in regions]
+        results = [numpy.zeros(0, dtype=numpy.int64) for r in parsed]
+        byChrom = {}
+        for i, (chrom, start, end) in enumerate(parsed):
+            byChrom.setdefault(chrom, []).append(i)
+        for chrom, members in byChrom.items():
+            if chrom not in self.chromosomes:
+                continue
+            starts, stops, maxStops, rows = self.chromosomes[chrom]
+            regionStarts = numpy.array([parsed[i][1] for i in members])
+            regionEnds = numpy.array([parsed[i][2] for i in members])
+            firsts = numpy.searchsorted(maxStops, regionStarts, side='right')
+            lasts = numpy.searchsorted(starts, regionEnds, side='left')
+            for i, first, last, start, end in zip(members, firsts, lasts, regionStarts, regionEnds):
+                candidates = slice(first, max(first, last))
+                if contained:
+                    keep = (starts[candidates] >= start) & (stops[candidates] <= end)
+                else:
+                    keep = stops[candidates] > start
+                results[i] = rows[candidates][keep]
+        return results
@@ -0,0 +1,150 @@
+import numpy
+import pandas as pd
+import scipy.sparse
+import scipy.sparse.csgraph
+from linkage_network import degreeCentrality
+
+#centrality measures computed by centralityTable, in report order
+centralityMeasures = ['degree', 'eigenvector', 'pageRank', 'closeness', 'betweenness']
+
+#number of float64 values held per batch of BFS sources (about 128 MB)
+batchValues = 2 ** 24
+
+#the adjacency as a float64 CSR matrix with a zero diagonal
+def csrAdjacency(adjacency):
+    adjacency = scipy.sparse.csr_matrix(adjacency, dtype=numpy.float64)
+    adjacency.setdiag(0)
+    adjacency.eliminate_zeros()
+    return adjacency
+
+#consecutive batches of sources, sized so a batch x nodes float64 array stays within batchValues
+def sourceBatches(sources, nodeCount):
+    batchSize = max(1, batchValues // max(nodeCount, 1))
+    return [sources[start:start+batchSize] for start in range(0, len(sources), batchSize)]
+
+#Eigenvector centrality by power iteration of x <- x + Ax (the added identity keeps bipartite parts from oscillating),
+#normalized to unit length; stops when the change is below nodeCount * tolerance
+def eigenvectorCentrality(adjacency, maxIterations=1000, tolerance=1e-6):
+    adjacency = csrAdjacency(adjacency)
+    nodeCount = adjacency.shape[0]
+    x = numpy.full(nodeCount, 1 / nodeCount)
+    for iteration in range(maxIterations):
+        previous = x
+        x = previous + adjacency @ previous
+        norm = numpy.linalg.norm(x)
+        x = x / norm if norm > 0 else x
+        if numpy.abs(x - previous).sum() < nodeCount * tolerance:
+            break
+    return x
+
+#PageRank with damping, by power iteration on the row-normalized adjacency; nodes without edges spread their rank uniformly
+def pageRank(adjacency, damping=0.85, maxIterations=100, tolerance=1e-6):
+    adjacency = csrAdjacency(adjacency)
+    nodeCount = adjacency.shape[0]
+    degrees = numpy.asarray(adjacency.sum(axis=1)).ravel()
+    dangling = degrees == 0
+    transition = scipy.sparse.diags(numpy.divide(1, degrees, out=numpy.zeros(nodeCount), where=~dangling)) @ adjacency
+    x = numpy.full(nodeCount, 1 / nodeCount)
+    for iteration in range(maxIterations):
+        previous = x
+        x = damping * (transition.T @ previous + previous[dangling].sum() / nodeCount) + (1 - damping) / nodeCount
+        if numpy.abs(x - previous).sum() < nodeCount * tolerance:
+            break
+    return x
+
+#Closeness centrality (r-1)/sum of distances * (r-1)/(n-1), r the nodes reachable from a node including itself, so
+#disconnected graphs are handled. BFS distances come from scipy in batches of sources. With samples, distances are only
+#computed from that many random pivots and the mean distance of every node is estimated from them (Eppstein-Wang)
+def closenessCentrality(adjacency, samples=None, seed=0):
+    adjacency = csrAdjacency(adjacency)
+    nodeCount = adjacency.shape[0]
+    if nodeCount < 2:
+        return numpy.zeros(nodeCount)
+    sampled = samples is not None and samples < nodeCount
+    sources = numpy.random.default_rng(seed).choice(nodeCount, samples, replace=False) if sampled else numpy.arange(nodeCount)
+    distanceSums = numpy.zeros(nodeCount)
+    reachable = numpy.zeros(nodeCount)
+    for batch in sourceBatches(sources, nodeCount):
+        distances = scipy.sparse.csgraph.shortest_path(adjacency, directed=False, unweighted=True, indices=batch)
+        finite = numpy.isfinite(distances)
+        if sampled:
+            #distances are symmetric, so the columns give the distance of every node to the pivots
+            distanceSums += numpy.where(finite, distances, 0).sum(axis=0)
+            reachable += finite.sum(axis=0)
+        else:
+            distanceSums[batch] = numpy.where(finite, distances, 0).sum(axis=1)
+            reachable[batch] = finite.sum(axis=1)
+    if sampled:
+        #scale the pivot sums up to every node
+        distanceSums = distanceSums * nodeCount / len(sources)
+        reachable = reachable * nodeCount / len(sources)
+    others = reachable - 1
+    return numpy.divide(others * others, distanceSums * (nodeCount - 1), out=numpy.zeros(nodeCount), where=distanceSums > 0)
+
+#Neighbors of every node in nodes in a CSR adjacency: returns (neighbor, position in nodes) for every edge leaving them
+def expandNeighbors(adjacency, nodes):
+    starts = adjacency.indptr[nodes]
+    degrees = adjacency.indptr[nodes + 1] - starts
+    owners = numpy.repeat(numpy.arange(len(nodes)), degrees)
+    offsets = numpy.arange(len(owners)) - numpy.repeat(numpy.cumsum(degrees) - degrees, degrees)
+    return adjacency.indices[starts[owners] + offsets], owners
+
+#Betweenness centrality by Brandes' accumulation for a batch of sources at a time. Every BFS level of the whole batch is
+#expanded as one vectorized step over the edges leaving that level, so the work is proportional to the edges reached
+#With samples, only that many random sources are used and the result is scaled up by nodeCount/samples
+#Normalized by (n-1)(n-2) like networkx
+def betweennessCentrality(adjacency, samples=None, seed=0):
+    adjacency = csrAdjacency(adjacency)
+    nodeCount = adjacency.shape[0]
+    sampled = samples is not None and samples < nodeCount
+    sources = numpy.random.default_rng(seed).choice(nodeCount, samples, replace=False) if sampled else numpy.arange(nodeCount)
+    betweenness = numpy.zeros(nodeCount)
+    #three nodes x batch arrays are held at once
+    for batch in sourceBatches(sources, nodeCount * 3):
+        batchSize = len(batch)
+        #entries of the flattened nodes x batch arrays are node * batchSize + column of the source
+        depth = numpy.full(nodeCount * batchSize, -1, dtype=numpy.int32)
+        paths = numpy.zeros(nodeCount * batchSize)
+        levels = [batch * batchSize + numpy.arange(batchSize)]
+        depth[levels[0]] = 0
+        paths[levels[0]] = 1
+        while len(levels[-1]):
+            frontier = levels[-1]
+            neighbors, owners = expandNeighbors(adjacency, frontier // batchSize)
+            entries = neighbors * batchSize + frontier[owners] % batchSize
+            unvisited = depth[entries] < 0
+            entries, owners = entries[unvisited], owners[unvisited]
+            nextLevel, inverse = numpy.unique(entries, return_inverse=True)
+            depth[nextLevel] = len(levels)
+            paths[nextLevel] = numpy.bincount(inverse, weights=paths[frontier[owners]], minlength=len(nextLevel))
+            levels.append(nextLevel)
+        #walk the levels back, each node passing (1 + its dependency) / its paths to its predecessors one level up
+        dependency = numpy.zeros(nodeCount * batchSize)
+        for d in range(len(levels) - 2, 0, -1):
+            level = levels[d]
+            neighbors, owners = expandNeighbors(adjacency, level // batchSize)
+            entries = neighbors * batchSize + level[owners] % batchSize
+            predecessors = depth[entries] == d - 1
+            entries, owners = entries[predecessors], owners[predecessors]
+            share = (1 + dependency[level]) / paths[level]
+            numpy.add.at(dependency, entries, paths[entries] * share[owners])
+        dependency[levels[0]] = 0
+        betweenness += dependency.reshape(nodeCount, batchSize).sum(axis=1)
+    if nodeCount > 2:
+        betweenness = betweenness / ((nodeCount - 1) * (nodeCount - 2))
+    if sampled:
+        betweenness = betweenness * nodeCount / len(sources)
+    return betweenness
+
+#Table of the centrality measures (see centralityMeasures) of every node of the adjacency, indexed by indices
+#samples limits closeness and betweenness to that many random sources, for networks too large for exact values
+def centralityTable(adjacency, indices, measures=centralityMeasures, samples=None, seed=0):
+    adjacency = csrAdjacency(adjacency)
+    functions = {
+        'degree': lambda: degreeCentrality(adjacency),
+        'eigenvector': lambda: eigenvectorCentrality(adjacency),
+        'pageRank': lambda: pageRank(adjacency),
+        'closeness': lambda: closenessCentrality(adjacency, samples, seed),
+        'betweenness': lambda: betweennessCentrality(adjacency, samples, seed),
+    }
+    return pd.DataFrame({m: functions[m]() for m in measures}, index=indices)
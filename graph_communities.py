@@ -0,0 +1,162 @@
+import numpy
+import scipy.sparse
+
+#community detection methods offered by detectCommunities
+communityMethods = ['louvain', 'labelPropagation']
+
+#the adjacency as a symmetric float64 CSR matrix
+def weightedAdjacency(adjacency):
+    return scipy.sparse.csr_matrix(adjacency, dtype=numpy.float64)
+
+#Modularity of a partition: the fraction of edge weight inside communities minus the fraction expected when edges are
+#placed at random with the same degrees, sum over communities of in/2m - resolution * (tot/2m)^2
+def modularity(adjacency, labels, resolution=1.0):
+    adjacency = weightedAdjacency(adjacency).tocoo()
+    totalWeight = adjacency.data.sum()
+    if totalWeight == 0:
+        return 0.0
+    labels = numpy.asarray(labels)
+    inside = adjacency.data[labels[adjacency.row] == labels[adjacency.col]].sum()
+    totals = numpy.bincount(labels[adjacency.row], weights=adjacency.data)
+    return inside / totalWeight - resolution * ((totals / totalWeight) ** 2).sum()
+
+#Relabel communities 0..c-1 from the largest to the smallest; equal sizes keep the order of their first node
+def relabelBySize(labels):
+    uniqueLabels, firsts, inverse, sizes = numpy.unique(labels, return_index=True, return_inverse=True, return_counts=True)
+    order = numpy.lexsort((firsts, -sizes))
+    newLabels = numpy.empty(len(uniqueLabels), dtype=numpy.int64)
+    newLabels[order] = numpy.arange(len(uniqueLabels))
+    return newLabels[inverse.ravel()]
+
+#One Louvain local moving phase. Every round the modularity gain of moving each node to each neighboring community is
+#computed for all nodes at once from one sort of the (node, neighbor community) pairs; a random half of the nodes that can
+#gain then move together, which keeps simultaneous moves from oscillating. When that gains less than tolerance modularity,
+#only the node with the largest gain moves. Stops when no node can gain, when even that single move gains less than
+#tolerance, or after maxRounds, so every round raises the modularity by at least tolerance
+#Returns the community of every node and whether any node moved
+def louvainMoveNodes(adjacency, rng, resolution=1.0, maxRounds=1000, tolerance=1e-7):
+    nodeCount = adjacency.shape[0]
+    totalWeight = adjacency.data.sum()
+    degrees = numpy.asarray(adjacency.sum(axis=1)).ravel()
+    edges = adjacency.tocoo()
+    offDiagonal = edges.row != edges.col
+    rows, columns, weights = edges.row[offDiagonal].astype(numpy.int64), edges.col[offDiagonal], edges.data[offDiagonal]
+    labels = numpy.arange(nodeCount)
+    quality = modularity(adjacency, labels, resolution)
+    improved = False
+    for iteration in range(maxRounds):
+        totals = numpy.bincount(labels, weights=degrees, minlength=nodeCount)
+        keys, inverse = numpy.unique(rows * nodeCount + labels[columns], return_inverse=True)
+        linkWeights = numpy.bincount(inverse.ravel(), weights=weights, minlength=len(keys))
+        keyNodes, keyLabels = keys // nodeCount, keys % nodeCount
+        isCurrent = keyLabels == labels[keyNodes]
+        #totals of the target communities without the node itself, so staying and moving are compared fairly
+        gains = linkWeights - resolution * (totals[keyLabels] - isCurrent * degrees[keyNodes]) * degrees[keyNodes] / totalWeight
+        currentGains = -resolution * (totals[labels] - degrees) * degrees / totalWeight
+        currentGains[keyNodes[isCurrent]] = gains[isCurrent]
+        order = numpy.lexsort((rng.random(len(keys)), -gains, keyNodes))
+        firsts = order[numpy.r_[True, keyNodes[order][1:] != keyNodes[order][:-1]]] if len(keys) else order
+        movable = firsts[gains[firsts] > currentGains[keyNodes[firsts]] + 1e-12]
+        if not len(movable):
+            break
+        moving = movable[rng.random(len(movable)) < 0.5]
+        newLabels = labels.copy()
+        newLabels[keyNodes[moving]] = keyLabels[moving]
+        newQuality = modularity(adjacency, newLabels, resolution)
+        if newQuality - quality < tolerance:
+            #the simultaneous moves did not pay off, move only the node that gains most on its own instead
+            moving = movable[(gains[movable] - currentGains[keyNodes[movable]]).argmax()]
+            newLabels = labels.copy()
+            newLabels[keyNodes[moving]] = keyLabels[moving]
+            newQuality = modularity(adjacency, newLabels, resolution)
+        if newQuality - quality < tolerance:
+            break
+        labels, quality, improved = newLabels, newQuality, True
+    return labels, improved
+
+#Louvain modularity optimization: alternate local moving and aggregation of every community into one node
+#(P^T A P with the membership matrix P) until no node moves. Returns the community of every node
+def louvain(adjacency, seed=0, resolution=1.0):
+    adjacency = weightedAdjacency(adjacency)
+    rng = numpy.random.default_rng(seed)
+    labels = numpy.arange(adjacency.shape[0])
+    if adjacency.data.sum() == 0:
+        return labels
+    level = adjacency
+    while True:
+        levelLabels, improved = louvainMoveNodes(level, rng, resolution)
+        if not improved:
+            break
+        uniqueLabels, levelLabels = numpy.unique(levelLabels, return_inverse=True)
+        levelLabels = levelLabels.ravel()
+        labels = levelLabels[labels]
+        membership = scipy.sparse.csr_matrix((numpy.ones(len(levelLabels)), (numpy.arange(len(levelLabels)), levelLabels)),
+                                             shape=(len(levelLabels), len(uniqueLabels)))
+        level = (membership.T @ level @ membership).tocsr()
+    return labels
+
+#Label propagation: every node takes the label carried by most of its neighbors (by edge weight), ties broken at random.
+#All nodes are updated together from one sort of the (node, neighbor label) pairs, but each round only a random half of
+#the nodes may change, which keeps synchronous updates from oscillating. Label propagation does not follow the modularity,
+#so single rounds may lower it; the labels with the highest modularity so far are kept, and the loop stops when no node
+#can change its label, after patience rounds in a row that do not raise that modularity by tolerance, or after maxRounds
+def labelPropagation(adjacency, seed=0, maxRounds=1000, tolerance=1e-7, patience=10):
+    adjacency = weightedAdjacency(adjacency).tocoo()
+    nodeCount = adjacency.shape[0]
+    rng = numpy.random.default_rng(seed)
+    labels = numpy.arange(nodeCount)
+    bestLabels, bestQuality, stalledRounds = labels, modularity(adjacency, labels), 0
+    offDiagonal = adjacency.row != adjacency.col
+    rows, columns, weights = adjacency.row[offDiagonal], adjacency.col[offDiagonal], adjacency.data[offDiagonal]
+    for iteration in range(maxRounds):
+        keys, inverse = numpy.unique(rows.astype(numpy.int64) * nodeCount + labels[columns], return_inverse=True)
+        labelWeights = numpy.bincount(inverse.ravel(), weights=weights, minlength=len(keys))
+        keyNodes, keyLabels = keys // nodeCount, keys % nodeCount
+        #per node, the heaviest label first, equal weights in random order
+        order = numpy.lexsort((rng.random(len(keys)), -labelWeights, keyNodes))
+        firsts = order[numpy.r_[True, keyNodes[order][1:] != keyNodes[order][:-1]]]
+        bestWeights = numpy.zeros(nodeCount)
+        bestWeights[keyNodes[firsts]] = labelWeights[firsts]
+        currentWeights = numpy.zeros(nodeCount)
+        isCurrent = keyLabels == labels[keyNodes]
+        currentWeights[keyNodes[isCurrent]] = labelWeights[isCurrent]
+        changeable = numpy.zeros(nodeCount, dtype=bool)
+        changeable[keyNodes[firsts]] = bestWeights[keyNodes[firsts]] > currentWeights[keyNodes[firsts]]
+        if not changeable.any():
+            break
+        update = changeable & (rng.random(nodeCount) < 0.5)
+        newLabels = labels.copy()
+        newLabels[keyNodes[firsts]] = keyLabels[firsts]
+        labels = numpy.where(update, newLabels, labels)
+        quality = modularity(adjacency, labels)
+        stalledRounds = stalledRounds + 1 if quality - bestQuality < tolerance else 0
+        if quality > bestQuality:
+            bestLabels, bestQuality = labels, quality
+        if stalledRounds >= patience:
+            break
+    return bestLabels
+
+#Detect communities of a (sparse or dense) adjacency with 'louvain' or 'labelPropagation'
+#Returns the community of every node, numbered from the largest community (0) to the smallest, and the modularity
+def detectCommunities(adjacency, method='louvain', seed=0):
+    if method == 'louvain':
+        labels = louvain(adjacency, seed)
+    elif method == 'labelPropagation':
+        labels = labelPropagation(adjacency, seed)
+    else:
+        raise ValueError('method must be one of ' + str(communityMethods) + ', got ' + str(method))
+    labels = relabelBySize(labels)
+    return labels, modularity(adjacency, labels)
+
+#positions of the nodes of every community, as a list of arrays indexed by community number
+def communityMembers(labels):
+    order = numpy.argsort(labels, kind='stable')
+    bounds = numpy.flatnonzero(numpy.diff(labels[order])) + 1
+    return numpy.split(order, bounds)
+
+#Size of every community and the sum of each feature column of featureDf (rows in node order) over its members
+def communityFeatureCounts(labels, featureDf):
+    countsDf = featureDf.groupby(numpy.asarray(labels)).sum()
+    countsDf.insert(0, 'size', numpy.bincount(labels))
+    countsDf.index.name = 'community'
+    return countsDf
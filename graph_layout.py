@@ -0,0 +1,124 @@
+import os
+import hashlib
+import numpy
+import scipy.sparse
+
+#directory receiving cached layouts, one .npy file of node positions per layout
+layoutCacheDirectory = 'layout-cache'
+
+#the adjacency as a boolean CSR matrix with sorted indices, so equal graphs always hash the same
+def layoutAdjacency(adjacency):
+    adjacency = scipy.sparse.csr_matrix(adjacency, dtype=bool)
+    adjacency.sort_indices()
+    return adjacency
+
+#Cell (column, row) of every position on a grid of size x size cells covering low..high
+def gridCells(positions, low, high, size):
+    cells = numpy.floor((positions - low) / (high - low) * size).astype(numpy.int64)
+    return numpy.clip(cells, 0, size - 1)
+
+#Approximate repulsive displacement k^2/d of every node from all others, Barnes-Hut style on a hierarchy of grids:
+#at each level a node is pushed by the centers of mass of the cells that are near its parent cell but not next to its own
+#cell (at most 27), and at the finest level also by the 9 cells around it, its own cell without itself. With about one node
+#per finest cell this is O(n log n) per iteration instead of the O(n^2) of every pair
+def repulsion(positions, k):
+    nodeCount = len(positions)
+    low, high = positions.min(axis=0), positions.max(axis=0)
+    high = numpy.where(high - low > 1e-9, high, low + 1e-9)
+    depth = max(1, int(numpy.ceil(numpy.log2(max(nodeCount, 4)) / 2)))
+    displacement = numpy.zeros((nodeCount, 2))
+    offsets = numpy.arange(-2, 4)
+    for level in range(1, depth + 1):
+        size = 2 ** level
+        cells = gridCells(positions, low, high, size)
+        cellIds = cells[:, 0] * size + cells[:, 1]
+        masses = numpy.bincount(cellIds, minlength=size * size).astype(numpy.float64)
+        sumsX = numpy.bincount(cellIds, weights=positions[:, 0], minlength=size * size)
+        sumsY = numpy.bincount(cellIds, weights=positions[:, 1], minlength=size * size)
+        #cells around the parent cell: the 6 x 6 children of the parent and of its 8 neighbors
+        columns = (cells[:, 0] // 2 * 2)[:, None, None] + offsets[None, :, None]
+        rows = (cells[:, 1] // 2 * 2)[:, None, None] + offsets[None, None, :]
+        use = (columns >= 0) & (columns < size) & (rows >= 0) & (rows < size)
+        if level < depth:
+            use &= (numpy.abs(columns - cells[:, 0, None, None]) > 1) | (numpy.abs(rows - cells[:, 1, None, None]) > 1)
+        nodes, columnSlots, rowSlots = numpy.nonzero(use)
+        ids = (cells[nodes, 0] // 2 * 2 + offsets[columnSlots]) * size + cells[nodes, 1] // 2 * 2 + offsets[rowSlots]
+        #leave each node out of its own cell
+        own = ids == cellIds[nodes]
+        cellMasses = masses[ids] - own
+        occupied = cellMasses > 0
+        nodes, ids, own, cellMasses = nodes[occupied], ids[occupied], own[occupied], cellMasses[occupied]
+        deltaX = positions[nodes, 0] - (sumsX[ids] - own * positions[nodes, 0]) / cellMasses
+        deltaY = positions[nodes, 1] - (sumsY[ids] - own * positions[nodes, 1]) / cellMasses
+        forces = cellMasses * k * k / numpy.maximum(deltaX ** 2 + deltaY ** 2, (1e-4 * k) ** 2)
+        displacement[:, 0] += numpy.bincount(nodes, weights=forces * deltaX, minlength=nodeCount)
+        displacement[:, 1] += numpy.bincount(nodes, weights=forces * deltaY, minlength=nodeCount)
+    return displacement
+
+#Fruchterman-Reingold force-directed layout of a (sparse) adjacency with Barnes-Hut style approximate repulsion
+#Starts from initialPositions (nodes x 2) when given, with a lower starting temperature so they are refined rather than
+#scrambled, otherwise from seeded random positions. Returns nodes x 2 positions scaled to [-1, 1] like networkx
+def forceLayout(adjacency, initialPositions=None, iterations=100, seed=0):
+    adjacency = layoutAdjacency(adjacency).tocoo()
+    nodeCount = adjacency.shape[0]
+    if nodeCount == 0:
+        return numpy.zeros((0, 2))
+    if initialPositions is None:
+        positions = numpy.random.default_rng(seed).random((nodeCount, 2))
+        temperature = 0.1
+    else:
+        positions = numpy.array(initialPositions, dtype=numpy.float64)
+        span = positions.max(axis=0) - positions.min(axis=0)
+        positions = (positions - positions.min(axis=0)) / numpy.where(span > 0, span, 1)
+        temperature = 0.02
+    if nodeCount == 1:
+        return numpy.zeros((1, 2))
+    k = numpy.sqrt(1 / nodeCount)
+    rows, columns = adjacency.row, adjacency.col
+    cooling = temperature / (iterations + 1)
+    for iteration in range(iterations):
+        displacement = repulsion(positions, k)
+        delta = positions[rows] - positions[columns]
+        distances = numpy.maximum(numpy.linalg.norm(delta, axis=1), 1e-9)
+        attraction = delta * (distances / k)[:, None]
+        displacement[:, 0] -= numpy.bincount(rows, weights=attraction[:, 0], minlength=nodeCount)
+        displacement[:, 1] -= numpy.bincount(rows, weights=attraction[:, 1], minlength=nodeCount)
+        lengths = numpy.maximum(numpy.linalg.norm(displacement, axis=1), 1e-9)
+        positions += displacement * (numpy.minimum(lengths, temperature) / lengths)[:, None]
+        temperature -= cooling
+    positions -= positions.mean(axis=0)
+    scale = numpy.abs(positions).max()
+    return positions / scale if scale > 0 else positions
+
+#cache key of a layout: the graph structure, the node labels, the start positions and the layout settings
+def layoutKey(adjacency, nodes, initialPositions, iterations, seed):
+    digest = hashlib.sha1()
+    digest.update(adjacency.indptr.astype(numpy.int64).tobytes())
+    digest.update(adjacency.indices.astype(numpy.int64).tobytes())
+    digest.update(repr([str(n) for n in nodes]).encode())
+    if initialPositions is not None:
+        digest.update(numpy.round(numpy.asarray(initialPositions, dtype=numpy.float64), 9).tobytes())
+    digest.update(repr((iterations, seed)).encode())
+    return digest.hexdigest()
+
+#Layout of the graph with the given adjacency, as a dict from node label (nodes, in adjacency order) to position, the
+#form networkx drawing functions take. Positions are stored in layoutCacheDirectory keyed by a hash of the adjacency and
+#settings, so a graph already laid out by any script is read back instead of computed again
+def cachedLayout(adjacency, nodes, iterations=100, seed=0, initialPositions=None, cacheDirectory=layoutCacheDirectory):
+    adjacency = layoutAdjacency(adjacency)
+    cacheFile = os.path.join(cacheDirectory, layoutKey(adjacency, nodes, initialPositions, iterations, seed) + '.npy')
+    if os.path.exists(cacheFile):
+        positions = numpy.load(cacheFile)
+    else:
+        positions = forceLayout(adjacency, initialPositions, iterations, seed)
+        os.makedirs(cacheDirectory, exist_ok=True)
+        numpy.save(cacheFile, positions)
+    return dict(zip(nodes, positions))
+
+#Layout of the subgraph of the nodes at positions members of a full graph, starting from their coordinates in fullLayout
+#(a dict from cachedLayout of the full graph), so a community keeps the shape it has in the full network
+def subgraphLayout(adjacency, nodes, members, fullLayout, iterations=50, seed=0, cacheDirectory=layoutCacheDirectory):
+    adjacency = layoutAdjacency(adjacency)[members][:, members]
+    memberNodes = [nodes[m] for m in members]
+    initialPositions = numpy.array([fullLayout[n] for n in memberNodes])
+    return cachedLayout(adjacency, memberNodes, iterations, seed, initialPositions, cacheDirectory)
@@ -0,0 +1,48 @@
+import numpy
+from plotting import plt
+
+#agglomerative methods offered by clusterHierarchy
+hierarchyMethods = ['average', 'complete', 'ward']
+
+#Number of items of a condensed distance vector (the strict upper triangle of an n x n matrix, row by row)
+def condensedSize(condensed):
+    return int(round((1 + numpy.sqrt(1 + 8 * len(condensed))) / 2))
+
+#Condensed float32 distance vector of a square distance matrix; entry (i, j), i < j, is at the same position as in scipy
+def condensedFromSquare(distances):
+    distances = numpy.asarray(distances)
+    upperA, upperB = numpy.triu_indices(len(distances), 1)
+    return distances[upperA, upperB].astype(numpy.float32)
+
+#Agglomerative clustering of a condensed distance vector with method 'average', 'complete' or 'ward'
+#Returns the scipy linkage tree: one row per merge (cluster a, cluster b, merge distance, size)
+#Ward assumes Euclidean distances; on Jaccard or linkage distances it is a heuristic that favours compact, even clusters
+def clusterHierarchy(condensed, method='average'):
+    import scipy.cluster.hierarchy
+    if method not in hierarchyMethods:
+        raise ValueError('method must be one of ' + str(hierarchyMethods) + ', got ' + str(method))
+    return scipy.cluster.hierarchy.linkage(condensed, method=method)
+
+#Cluster label (0..k-1) of every item for the cut of tree into k clusters; no re-clustering is needed for another k
+def cutHierarchy(tree, k):
+    import scipy.cluster.hierarchy
+    return scipy.cluster.hierarchy.cut_tree(tree, n_clusters=k).ravel()
+
+#Positions of the items in the left to right order of the dendrogram leaves, used to reorder heat maps
+def leafOrder(tree):
+    import scipy.cluster.hierarchy
+    return scipy.cluster.hierarchy.leaves_list(tree)
+
+#Draw the dendrogram of tree with items named labels and save it to saveToFile
+#When k is given, the branches of the k clusters of cutHierarchy are coloured
+def plotDendrogram(tree, labels, title, saveToFile, k=None):
+    import scipy.cluster.hierarchy
+    colorThreshold = None
+    if k is not None and 1 < k <= len(tree):
+        colorThreshold = (tree[-k, 2] + tree[-(k - 1), 2]) / 2
+    plt.figure(figsize=(max(6.4, len(labels) / 8), 4.8))
+    scipy.cluster.hierarchy.dendrogram(tree, labels=list(labels), color_threshold=colorThreshold, leaf_font_size=4)
+    plt.title(title)
+    plt.ylabel('Merge distance')
+    plt.tight_layout()
+    plt.savefig(saveToFile)
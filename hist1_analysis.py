@@ -1,37 +1,54 @@
 import numpy
 import math
 import pandas as pd
-import matplotlib.pyplot as plt
-import hist1_analysis as h1_mod
-import seaborn as sns
 import random
+import kmedoids
+import gam_data
+from genome_index import WindowIndex, hist1Region
 
-#returns a list of numbers of chr13 windows that are between 21.7 and 24.1 Mb
-def findHist1Windows(windowValuesDf):
-    chromType = "chr13"
-    startRange = 21700000
-    endRange = 24100000
-    hist1Windows = []
-
-    for index in range(0,windowValuesDf.shape[0]):
-        windowStart = windowValuesDf['start'][index]
-        windowEnd = windowValuesDf['stop'][index]
-        windowChrom = windowValuesDf['chrom'][index]
-        if (windowEnd > startRange and windowStart < endRange and windowChrom == chromType):
-            hist1Windows.append(index)
-    return hist1Windows
+#returns a list of numbers of windows overlapping region, by default the chr13 windows between 21.7 and 24.1 Mb
+#region may be 'chrom:start-end' or (chrom, start, end); pass a prebuilt WindowIndex to reuse it across many regions
+def findHist1Windows(windowValuesDf, region=hist1Region, windowIndex=None):
+    if windowIndex is None:
+        windowIndex = WindowIndex(windowValuesDf)
+    return numpy.sort(windowIndex.queryRegion(region)).tolist()
+
+#True if the columns of windowDetectionsDf are sparse (loaded with gam_data.loadSparseSegmentationData)
+def isSparseDetections(windowDetectionsDf):
+    return len(windowDetectionsDf.columns) > 0 and all(isinstance(d, pd.SparseDtype) for d in windowDetectionsDf.dtypes)
+
+#Detection counts of each NP (axis=0) or each window (axis=1) as a Series; sparse tables are summed in compressed form
+#from their cached CSR matrix (see gam_data.sparseDetectionMatrix)
+def detectionSums(windowDetectionsDf, axis):
+    if isSparseDetections(windowDetectionsDf):
+        sums = numpy.asarray(gam_data.sparseDetectionMatrix(windowDetectionsDf).sum(axis=axis)).ravel().astype(numpy.int64)
+        return pd.Series(sums, index=windowDetectionsDf.columns if axis == 0 else windowDetectionsDf.index)
+    return windowDetectionsDf.sum(axis=axis)
+
+#Detections of windowDetectionsDf as a float matrix for products (rows denote a window, columns denote an NP)
+#A scipy.sparse CSR matrix when the table is sparse (a copy of the table's cached matrix, converted once per table),
+#a numpy array otherwise; onlyOnes keeps only entries equal to 1
+def detectionMatrix(windowDetectionsDf, onlyOnes=False):
+    if isSparseDetections(windowDetectionsDf):
+        matrix = gam_data.sparseDetectionMatrix(windowDetectionsDf).copy()
+        if onlyOnes:
+            matrix.data = (matrix.data == 1).astype(numpy.float64)
+        return matrix
+    if onlyOnes:
+        return (windowDetectionsDf.to_numpy() == 1).astype(numpy.float64)
+    return windowDetectionsDf.to_numpy().astype(numpy.float64)
 
 #Returns a series of all NPs that detect hist1 windows, and the amount of windows they detect
 def windowsPerNP(hist1WindowDetectionsDf):
-    return hist1WindowDetectionsDf.sum(axis=0).where(lambda x : x != 0).dropna()
+    return detectionSums(hist1WindowDetectionsDf, 0).where(lambda x : x != 0).dropna()
 
 #for each window in hist1Windows, finds the amount of hist1NPs that detects it. Returns series
 def NPsPerWindow(hist1WindowDetectionsDf):
-    return hist1WindowDetectionsDf.sum(axis=1)
+    return detectionSums(hist1WindowDetectionsDf, 1)
 
 #for each np, rate its radial position between 1 (apical) and 5 (equitorial)
 def findNpRadialPositions(windowDetectionsDf):
-    npSumsSorted = windowDetectionsDf.sum(axis=0).sort_values()
+    npSumsSorted = detectionSums(windowDetectionsDf, 0).sort_values()
     for index,key in enumerate(npSumsSorted.keys()):
         npSumsSorted[key] = math.floor(index / (len(npSumsSorted)/5)) + 1
     return npSumsSorted
@@ -39,24 +56,41 @@ def findNpRadialPositions(windowDetectionsDf):
 #for each window, rate its compaction between 1 (most condensed) and 10 (least condensed)
 def findWindowCompactions(windowDetectionsDf):
     #sorts into ten equal groups -- wrong way?
-    windowSumsSorted = windowDetectionsDf.sum(axis=1).sort_values()
+    windowSumsSorted = detectionSums(windowDetectionsDf, 1).sort_values()
     for index,key in enumerate(windowSumsSorted.keys()):
         windowSumsSorted[key] = math.floor(index / (len(windowSumsSorted)/10)) + 1
     return windowSumsSorted
 
+#NP x feature table of the percentage of the windows detected by each NP that carry each feature. featureDf rows must be in
+#the same order as the windows of hist1WindowDetectionsDf; a feature is present in a window when its value is not 0
+#The overlaps of every NP with every feature are one product D^T F of the detection and feature matrices
+def npFeaturePercentages(hist1WindowDetectionsDf, featureDf, features):
+    detections = detectionMatrix(hist1WindowDetectionsDf)
+    featureMatrix = (featureDf[features].to_numpy() != 0).astype(numpy.float64)
+    overlaps = numpy.asarray(detections.T @ featureMatrix)
+    npSums = detectionSums(hist1WindowDetectionsDf, 0).to_numpy()[:,None]
+    percentages = numpy.divide(100 * overlaps, npSums, out=numpy.full(overlaps.shape, numpy.nan), where=npSums > 0)
+    return pd.DataFrame(percentages, index=hist1WindowDetectionsDf.columns, columns=features)
+
+#cluster number of every NP in clusters (lists of NPs), as a Series indexed by NP
+def clusterLabels(clusters):
+    return pd.Series([i for i, c in enumerate(clusters) for np in c], index=[np for c in clusters for np in c])
+
+#cluster x feature table of the average feature percentage (see npFeaturePercentages) over the NPs of each cluster
+#labels is a Series of the cluster of each NP (see clusterLabels); NPs without a label are left out
+def clusterFeatureEnrichment(npFeatureDf, labels):
+    return npFeatureDf.loc[labels.index].groupby(labels.to_numpy()).mean()
+
 #Given lists of NPs in each cluster and the medoid of each cluster, return the sum of distances from every NP to its medoid
 def assessClusteringQuality(clusters, medoids, npJaccards):
     return sum([sum([(1-npJaccards[np][med]) for np in c]) for (c, med) in zip(clusters,medoids)])
 
+#Given lists of NPs in each cluster and the medoid of each cluster, return the clustering scores of every NP against the
+#medoids (see kmedoids.clusteringScores): similarity and distance sums and averages, inter-cluster distance and silhouette
 def assignClusteringScores(clusters,clusterMedoids,npJaccards):
-    npAmount = sum([len(c) for c in clusters])
-    scores = {
-        'similaritySum': sum([sum([npJaccards[np][med] for np in c]) for c,med in zip(clusters,clusterMedoids)]),
-        'similarityAvg': sum([sum([npJaccards[np][med] for np in c]) for c,med in zip(clusters,clusterMedoids)])/npAmount,
-        'distanceSum': sum([sum([1-npJaccards[np][med] for np in c]) for c,med in zip(clusters,clusterMedoids)]),
-        'distanceAvg': sum([sum([1-npJaccards[np][med] for np in c]) for c,med in zip(clusters,clusterMedoids)])/npAmount
-    }
-    return scores
+    clusteredNPs = [np for c in clusters for np in c]
+    labels = numpy.repeat(numpy.arange(len(clusters)), [len(c) for c in clusters])
+    return kmedoids.clusteringScores(npJaccards.loc[clusteredNPs, list(clusterMedoids)].to_numpy(), labels)
 
 #Assign each element of hist1NPs to a cluster with an element of clusterMedoids at its center
 #Each element of the returned list denotes an NP, containing [cluster, np]
@@ -86,6 +120,13 @@ def randMax(dataList,randOffset=-1):
         randOffset = random.randint(0,len(dataList)-1)
     return doubledList.index(maxVal,randOffset) % len(dataList)
 
+#Given two NPs, find their Jaccard Index - J(A,B) = (A INTERSECTION B) / (A UNION B)
+def jaccard(npA, npB, hist1WindowDetectionsDf):
+    A = (hist1WindowDetectionsDf[npA] == 1)
+    B = (hist1WindowDetectionsDf[npB] == 1)
+    if (A & B).sum() == 0: return 0
+    return  (A & B).sum() / (A | B).sum()
+
 #Given two NPs, find their Normalized Jaccard Index - Jn(A,B) = (A INTERSECTION B) / min(|A|, |B|)
 def normalizedJaccard(npA, npB, hist1WindowDetectionsDf):
     A = (hist1WindowDetectionsDf[npA] == 1)
@@ -93,26 +134,84 @@ def normalizedJaccard(npA, npB, hist1WindowDetectionsDf):
     if (A | B).sum() == 0: return 0
     return (A & B).sum() / min(A.sum(), B.sum())
 
+#Jaccard Index from intersection counts and the detection counts of A and B, works element-wise on arrays
+def jaccardFromCounts(intersection, countA, countB):
+    with numpy.errstate(divide='ignore', invalid='ignore'):
+        return numpy.where(intersection == 0, 0, intersection / (countA + countB - intersection))
+
+#Normalized Jaccard Index from intersection counts and the detection counts of A and B, works element-wise on arrays
+def normalizedJaccardFromCounts(intersection, countA, countB):
+    with numpy.errstate(divide='ignore', invalid='ignore'):
+        return numpy.where(countA + countB - intersection == 0, 0, intersection / numpy.minimum(countA, countB))
+
+#Given the detections of hist1NPs, compute the Jaccard Index, Normalized Jaccard Index and their distances for every pair of NPs
+#Intersections come from one matrix product, the indices are derived for the upper triangle only and mirrored
+#Returns a dict of DataFrames indexed by NP: 'jaccard', 'normalizedJaccard', 'distance' (1-J) and 'normalizedDistance' (1-Jn)
+def jaccardMatrices(hist1WindowDetectionsDf, hist1NPs=None):
+    if hist1NPs is None:
+        hist1NPs = list(hist1WindowDetectionsDf.columns)
+    detections = detectionMatrix(hist1WindowDetectionsDf.loc[:,hist1NPs], onlyOnes=True)
+    intersections = detections.T @ detections
+    if hasattr(intersections, 'toarray'):
+        intersections = intersections.toarray()
+    counts = numpy.diag(intersections)
+
+    upperA, upperB = numpy.triu_indices(len(counts))
+    intersection = intersections[upperA, upperB]
+    upperJaccard = jaccardFromCounts(intersection, counts[upperA], counts[upperB])
+    upperNormalized = normalizedJaccardFromCounts(intersection, counts[upperA], counts[upperB])
+
+    matrices = {}
+    for name, upper in [('jaccard', upperJaccard), ('normalizedJaccard', upperNormalized)]:
+        full = numpy.zeros(intersections.shape)
+        full[upperA, upperB] = upper
+        full[upperB, upperA] = upper
+        matrices[name] = pd.DataFrame(full, index=hist1NPs, columns=hist1NPs)
+    matrices['distance'] = 1 - matrices['jaccard']
+    matrices['normalizedDistance'] = 1 - matrices['normalizedJaccard']
+    return matrices
+
+#Condensed float32 vector of the Jaccard distances (1 - normalized Jaccard, or 1 - Jaccard with normalized=False) of every
+#pair of NPs, in scipy's condensed order (strict upper triangle, row by row); half the memory of the square matrix
+def condensedJaccardDistances(hist1WindowDetectionsDf, hist1NPs=None, normalized=True):
+    if hist1NPs is None:
+        hist1NPs = list(hist1WindowDetectionsDf.columns)
+    detections = detectionMatrix(hist1WindowDetectionsDf.loc[:,hist1NPs], onlyOnes=True)
+    intersections = detections.T @ detections
+    if hasattr(intersections, 'toarray'):
+        intersections = intersections.toarray()
+    counts = numpy.diag(intersections)
+    upperA, upperB = numpy.triu_indices(len(counts), 1)
+    fromCounts = normalizedJaccardFromCounts if normalized else jaccardFromCounts
+    return (1 - fromCounts(intersections[upperA, upperB], counts[upperA], counts[upperB])).astype(numpy.float32)
+
 #performs K-Medoids clustering on values in hist1NPs, with similarities denoted in npJaccards, starting with clusterMedoids medoids
+#the iterations run on a numpy copy of npJaccards with integer NP labels; method selects the algorithm (see kmedoids),
+#every one accepts any k = len(clusterMedoids):
+#   'voronoi'   alternate assignment and medoid update (kmedoids.runKMedoids), starting from clusterMedoids
+#   'fasterpam' FasterPAM swaps minimizing the total distance 1 - similarity, starting from clusterMedoids
+#   'clara'     FasterPAM on random samples of the NPs, keeping the best medoids over all NPs; for large NP sets
+#   'clarans'   randomized swap search from random medoids; for large NP sets
 #returns clusters and clusterMedoids
-def runKMedoidsClustering(clusterMedoids, hist1NPs, npJaccards):
-    clusterPreferences = [random.randint(0,3) for x in hist1NPs]
-        #An arbitrary preference of which cluster to be assigned to in case of a tie
-    clusterAssignments = h1_mod.assignKMeansCluster(hist1NPs, clusterMedoids, npJaccards, clusterPreferences)
-    clusters = h1_mod.arrangeClusters(clusterAssignments, 3)
-    running = True
-    iterations = 1
-    while (running):
-        clusterMedoids = [h1_mod.findClusterMedoid(c,npJaccards) for c in clusters]
-        nextAssignments = h1_mod.assignKMeansCluster(hist1NPs, clusterMedoids, npJaccards, clusterPreferences)
-        nextClusters = h1_mod.arrangeClusters(clusterAssignments,3)
-        if (nextAssignments == clusterAssignments):
-            running = False
-        clusterAssignments = nextAssignments
-        clusters = nextClusters
-        iterations += 1
-
-    return clusters, clusterMedoids
+def runKMedoidsClustering(clusterMedoids, hist1NPs, npJaccards, method='voronoi'):
+    hist1NPs = list(hist1NPs)
+    npPositions = {np: i for i, np in enumerate(hist1NPs)}
+    similarities = npJaccards.loc[hist1NPs, hist1NPs].to_numpy()
+    k = len(clusterMedoids)
+    if method == 'voronoi':
+        clusterPreferences = [random.randint(0,k) for x in hist1NPs]
+            #An arbitrary preference of which cluster to be assigned to in case of a tie
+        labels, medoids, iterations = kmedoids.runKMedoids(similarities, [npPositions[m] for m in clusterMedoids], clusterPreferences)
+    elif method == 'fasterpam':
+        labels, medoids, swaps = kmedoids.fasterPAM(1 - similarities, [npPositions[m] for m in clusterMedoids])
+    elif method == 'clara':
+        labels, medoids, samples = kmedoids.clara(1 - similarities, k, len(hist1NPs), numpy.random.default_rng(random.getrandbits(64)))
+    elif method == 'clarans':
+        labels, medoids, swaps = kmedoids.clarans(1 - similarities, k, len(hist1NPs), numpy.random.default_rng(random.getrandbits(64)))
+    else:
+        raise ValueError('unknown k-medoids method ' + str(method))
+    clusters = kmedoids.labelsToClusters(labels, hist1NPs, k)
+    return clusters, [hist1NPs[m] for m in medoids]
 
 
 #number of NPs in which a window is detected, divided by total numbers of NPs
@@ -138,3 +237,53 @@ def normalizedLinkage(windowA, windowB):
     elif D > 0:
         return D / min(fB * (1-fA), fA * (1-fB))
     return 0
+
+#Normalized linkage from detection frequencies, works element-wise on arrays of any matching shape
+#D-max follows the sign of D; pairs with D = 0 (or a zero D-max, e.g. a window detected by no NPs) get 0
+def normalizedLinkageFromFrequencies(fA, fB, fAB):
+    D = fAB - fA * fB
+    dMax = numpy.where(D < 0, numpy.minimum(fA * fB, (1-fA) * (1-fB)), numpy.minimum(fB * (1-fA), fA * (1-fB)))
+    with numpy.errstate(divide='ignore', invalid='ignore'):
+        return numpy.where((D != 0) & (dMax != 0), D / dMax, 0.0)
+
+#Normalized linkage for every pair of a window in detectionsA and a window in detectionsB
+#detectionsA and detectionsB are arrays or scipy.sparse matrices whose rows denote a window and columns denote the same NPs
+def normalizedLinkageBlock(detectionsA, detectionsB):
+    npCount = detectionsA.shape[1]
+    if hasattr(detectionsA, 'tocsr'):
+        detectionsA = detectionsA.tocsr().astype(numpy.float64)
+        detectionsB = detectionsB.tocsr().astype(numpy.float64)
+        fAB = (detectionsA @ detectionsB.T).toarray() / npCount
+    else:
+        detectionsA = numpy.asarray(detectionsA, dtype=numpy.float64)
+        detectionsB = numpy.asarray(detectionsB, dtype=numpy.float64)
+        fAB = (detectionsA @ detectionsB.T) / npCount
+    fA = numpy.asarray(detectionsA.sum(axis=1)).ravel() / npCount
+    fB = numpy.asarray(detectionsB.sum(axis=1)).ravel() / npCount
+    return normalizedLinkageFromFrequencies(fA[:,None], fB[None,:], fAB)
+
+#Normalized linkage table of every pair of windows in hist1WindowDetectionsDf (rows denote a window, columns denote an NP)
+#f(A), f(A,B), D and D-max are computed for all pairs at once, counting a detection where the value is 1 (as the tiled
+#path does); the result is indexed by window on both axes
+def normalizedLinkageMatrix(hist1WindowDetectionsDf):
+    detections = detectionMatrix(hist1WindowDetectionsDf, onlyOnes=True)
+    indices = hist1WindowDetectionsDf.index
+    return pd.DataFrame(normalizedLinkageBlock(detections, detections), index=indices, columns=indices)
+
+#Condensed float32 vector of the linkage distances (1 - normalized linkage, between 0 and 2) of every pair of windows in
+#hist1WindowDetectionsDf, in scipy's condensed order. Computed in blocks of rows so the square table is never held in memory
+def condensedLinkageDistances(hist1WindowDetectionsDf, blockRows=1024):
+    detections = detectionMatrix(hist1WindowDetectionsDf, onlyOnes=True)
+    if hasattr(detections, 'tocsr'):
+        detections = detections.tocsr()
+    windowCount = detections.shape[0]
+    condensed = numpy.zeros(windowCount * (windowCount - 1) // 2, dtype=numpy.float32)
+    position = 0
+    for first in range(0, windowCount, blockRows):
+        last = min(first + blockRows, windowCount)
+        block = 1 - normalizedLinkageBlock(detections[first:last], detections[first:])
+        for row in range(last - first):
+            upper = block[row, row+1:]
+            condensed[position:position + len(upper)] = upper
+            position += len(upper)
+    return condensed
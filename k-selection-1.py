@@ -0,0 +1,71 @@
+import gam_data
+from plotting import plt
+import hist1_analysis as h1_mod
+import random
+import kmedoids
+
+
+def main():
+    #input data file
+    dataFile = 'GSE64881_segmentation_at_30000bp.passqc.multibam.txt'
+    #windowValuesDf columns denote chromosome name and start and stop position, windowDetectionsDf columns denote an NP
+    #rows denote a window in both; loaded from a memory-mapped binary cache of dataFile
+    windowValuesDf, windowDetectionsDf = gam_data.loadSegmentationData(dataFile)
+
+    #open output file
+    outputFile = open("reports/k-selection-1-report.md", 'w')
+    outputFile.write('# K Selection 1 Report\n')
+
+    #extract Hist1 windows and NPs
+    hist1Windows = h1_mod.findHist1Windows(windowValuesDf)
+    hist1WindowDetectionsDf = windowDetectionsDf.iloc[hist1Windows,:]
+    hist1NpSums = h1_mod.windowsPerNP(hist1WindowDetectionsDf)
+    hist1NPs = list(hist1NpSums.index)
+
+    #construct a matrix of Jaccard Indices for each pair of NPs
+    npJaccards = h1_mod.jaccardMatrices(hist1WindowDetectionsDf, hist1NPs)['normalizedJaccard']
+
+    #cluster the NPs for every k, keeping the run with the lowest total distance of each k
+    kValues = list(range(2, 11))
+    restarts = 20
+    sweep = kmedoids.kSweep(npJaccards.to_numpy(), kValues, restarts, seed=random.randrange(2**32))
+    outputFile.write(str(restarts) + ' runs of k-medoids clustering performed for each k from ' + str(kValues[0]) + ' to ' + str(kValues[-1]) + '\n\n')
+
+    #elbow chart of the total distance of every NP to its medoid
+    plt.figure()
+    plt.plot(sweep['k'], sweep['totalDistance'], marker='o')
+    plt.title('Total distance of each NP to its medoid')
+    plt.xlabel('Number of clusters (k)')
+    plt.ylabel('Sum of distances to medoids')
+    saveToFile = 'charts/k-selection-1-total-distance.png'
+    plt.savefig(saveToFile)
+    outputFile.write('![Total medoid distance](../' + saveToFile + ')\n\n')
+
+    #mean silhouette of every k, the chosen k is the highest
+    plt.figure()
+    plt.plot(sweep['k'], sweep['silhouette'], marker='o')
+    plt.axvline(sweep['bestK'], color='red', linestyle='--')
+    plt.title('Mean silhouette of each clustering')
+    plt.xlabel('Number of clusters (k)')
+    plt.ylabel('Mean silhouette')
+    saveToFile = 'charts/k-selection-1-silhouette.png'
+    plt.savefig(saveToFile)
+    outputFile.write('![Mean silhouette](../' + saveToFile + ')\n\n')
+
+    outputFile.write('| k | Total distance | Mean silhouette |\n| --- | --- | --- |\n')
+    for k, totalDistance, silhouette in zip(sweep['k'], sweep['totalDistance'], sweep['silhouette']):
+        outputFile.write('| ' + str(k) + ' | ' + str(totalDistance) + ' | ' + str(silhouette) + ' |\n')
+    outputFile.write('\n')
+
+    bestIndex = kValues.index(sweep['bestK'])
+    bestClusters = kmedoids.labelsToClusters(sweep['labels'][bestIndex], hist1NPs, sweep['bestK'])
+    outputFile.write('Chosen k (highest mean silhouette): ' + str(sweep['bestK']) + '\n\n')
+    outputFile.write('Final Medoids: ' + str([hist1NPs[m] for m in sweep['medoids'][bestIndex]]) + '\n\n')
+    outputFile.write('Size of each cluster: ' + str([len(c) for c in bestClusters]) + '\n\n')
+
+    outputFile.close()
+    return
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,365 @@
+import os
+import math
+import itertools
+import multiprocessing
+import numpy
+
+#K-medoids clustering on a square numpy similarity matrix (e.g. normalized Jaccard, distance = 1 - similarity)
+#NPs are integer row numbers, medoids an integer array of k row numbers, clusters an integer label per NP
+
+#Draw tie-break preferences the way runKMedoidsClustering always has: one random offset in [0,k] per NP
+def randomPreferences(npCount, k, rng):
+    return rng.integers(0, k + 1, size=npCount)
+
+#Assign every NP to the medoid it is most similar to, an argmax over the medoid columns of similarities
+#With preferences, ties go to the first tied medoid at or after the NP's preference, wrapping around (as randMax does);
+#without, to the lowest tied medoid
+def assignClusters(similarities, medoids, preferences=None):
+    medoidSimilarities = similarities[:, medoids]
+    if preferences is None:
+        return medoidSimilarities.argmax(axis=1)
+    k = len(medoids)
+    isMax = medoidSimilarities == medoidSimilarities.max(axis=1, keepdims=True)
+    rank = (numpy.arange(k)[None, :] - numpy.asarray(preferences)[:, None]) % k
+    return numpy.where(isMax, rank, k).argmin(axis=1)
+
+#For each cluster, the member with the largest summed similarity to the other members of the cluster
+#Ties go to the first such member, or to a random one when rng is given; an empty cluster keeps its medoid
+def updateMedoids(similarities, labels, medoids, rng=None):
+    newMedoids = numpy.array(medoids)
+    for c in range(len(medoids)):
+        members = numpy.flatnonzero(labels == c)
+        if len(members) == 0:
+            continue
+        sums = similarities[numpy.ix_(members, members)].sum(axis=1)
+        if rng is None:
+            newMedoids[c] = members[sums.argmax()]
+        else:
+            newMedoids[c] = members[rng.choice(numpy.flatnonzero(sums == sums.max()))]
+    return newMedoids
+
+#Alternate assignment and medoid update from the starting medoids until the assignments stop changing
+#preferences: per-NP tie-break offsets for assignment (see assignClusters), rng: randomizes medoid ties
+#Returns labels, medoids and the amount of iterations
+def runKMedoids(similarities, medoids, preferences=None, rng=None, maxIterations=1000):
+    medoids = numpy.array(medoids)
+    labels = assignClusters(similarities, medoids, preferences)
+    iterations = 1
+    while iterations < maxIterations:
+        medoids = updateMedoids(similarities, labels, medoids, rng)
+        nextLabels = assignClusters(similarities, medoids, preferences)
+        iterations += 1
+        if numpy.array_equal(nextLabels, labels):
+            break
+        labels = nextLabels
+    return labels, medoids, iterations
+
+#Convert integer labels to k lists of the items (e.g. NP names) in each cluster, keeping the order of items
+def labelsToClusters(labels, items, k):
+    return [[items[i] for i in numpy.flatnonzero(labels == c)] for c in range(k)]
+
+#Distance block between the NPs in rows and the NPs in columns; distances is a square array or a callable(rows, columns)
+#returning that block, so sampling methods can run without the full matrix
+def distanceBlock(distances, rows, columns):
+    if callable(distances):
+        return numpy.asarray(distances(rows, columns), dtype=numpy.float64)
+    return distances[numpy.ix_(rows, columns)]
+
+#nearest medoid of every NP and its distances to the nearest and second nearest medoid, given the NP x medoid distance
+#columns; with one medoid there is no second nearest and its distance is infinite
+def nearestMedoids(medoidDistances):
+    order = numpy.argsort(medoidDistances, axis=1, kind='stable')[:, :2]
+    rows = numpy.arange(len(medoidDistances))
+    nearest = order[:, 0]
+    if medoidDistances.shape[1] < 2:
+        return nearest, medoidDistances[rows, nearest], numpy.full(len(rows), numpy.inf)
+    return nearest, medoidDistances[rows, nearest], medoidDistances[rows, order[:, 1]]
+
+#FasterPAM swap optimization on a square distance matrix, starting from medoids
+#Non-medoids are visited in turn; for each the change of total deviation of swapping it with every medoid is computed
+#in one pass over the NPs, and the best swap is applied as soon as it improves. Stops after a full pass without a swap
+#With k = 1 the removal loss is undefined (no second medoid), so the medoid is the NP with the smallest distance sum
+#Returns labels, medoids and the amount of swaps
+def fasterPAM(distances, medoids, maxSwaps=100000):
+    distances = numpy.asarray(distances, dtype=numpy.float64)
+    n = len(distances)
+    medoids = numpy.array(medoids)
+    k = len(medoids)
+    if k == 1:
+        sums = distances.sum(axis=0)
+        swaps = int(sums.min() < sums[medoids[0]])
+        return numpy.zeros(n, dtype=numpy.int64), numpy.array([sums.argmin()]) if swaps else medoids, swaps
+    nearest, nearestDistance, secondDistance = nearestMedoids(distances[:, medoids])
+    removalLoss = numpy.bincount(nearest, weights=secondDistance - nearestDistance, minlength=k)
+    isMedoid = numpy.zeros(n, dtype=bool)
+    isMedoid[medoids] = True
+
+    swaps = 0
+    lastSwap = 0
+    candidate = 0
+    while swaps < maxSwaps:
+        if not isMedoid[candidate]:
+            candidateDistance = distances[:, candidate]
+            closer = candidateDistance < nearestDistance
+            between = ~closer & (candidateDistance < secondDistance)
+            delta = removalLoss + (candidateDistance - nearestDistance)[closer].sum()
+            delta = delta + numpy.bincount(nearest[closer], weights=(nearestDistance - secondDistance)[closer], minlength=k)
+            delta = delta + numpy.bincount(nearest[between], weights=(candidateDistance - secondDistance)[between], minlength=k)
+            best = delta.argmin()
+            if delta[best] < -1e-12:
+                isMedoid[medoids[best]] = False
+                isMedoid[candidate] = True
+                medoids[best] = candidate
+                nearest, nearestDistance, secondDistance = nearestMedoids(distances[:, medoids])
+                removalLoss = numpy.bincount(nearest, weights=secondDistance - nearestDistance, minlength=k)
+                swaps += 1
+                lastSwap = candidate
+        candidate = (candidate + 1) % n
+        if candidate == lastSwap:
+            break
+    return nearest, medoids, swaps
+
+#total deviation (sum of distances of every NP to its nearest medoid) and labels of a set of medoids
+def medoidCost(distances, medoids, n):
+    medoidDistances = distanceBlock(distances, numpy.arange(n), medoids)
+    return medoidDistances.min(axis=1).sum(), medoidDistances.argmin(axis=1)
+
+#CLARA: run FasterPAM on samples random samples of sampleSize NPs (by default 40 + 2k) and keep the medoids with the
+#lowest total deviation over all NPs. distances may be a callable (see distanceBlock), only sample blocks and n x k
+#columns are ever computed. Returns labels, medoids and the amount of samples
+def clara(distances, k, n, rng, samples=5, sampleSize=None):
+    sampleSize = min(n, sampleSize or 40 + 2 * k)
+    bestCost, bestLabels, bestMedoids = numpy.inf, None, None
+    for s in range(samples):
+        if bestMedoids is None:
+            sample = numpy.sort(rng.choice(n, sampleSize, replace=False))
+        else:
+            #keep the best medoids so far in every sample, as CLARA does, and draw the rest from the other NPs
+            others = numpy.setdiff1d(numpy.arange(n), bestMedoids)
+            sample = numpy.union1d(rng.choice(others, sampleSize - k, replace=False), bestMedoids)
+        sampleStart = rng.choice(len(sample), k, replace=False)
+        sampleLabels, sampleMedoids, swaps = fasterPAM(distanceBlock(distances, sample, sample), sampleStart)
+        medoids = sample[sampleMedoids]
+        cost, labels = medoidCost(distances, medoids, n)
+        if cost < bestCost:
+            bestCost, bestLabels, bestMedoids = cost, labels, medoids
+    return bestLabels, bestMedoids, samples
+
+#CLARANS: from numLocal random starts, try up to maxNeighbor random medoid/non-medoid swaps and move to any swap that lowers
+#the total deviation; keep the best local minimum. distances may be a callable (see distanceBlock)
+#Returns labels, medoids and the amount of accepted swaps
+def clarans(distances, k, n, rng, numLocal=2, maxNeighbor=None):
+    maxNeighbor = maxNeighbor or max(250, int(0.0125 * k * (n - k)))
+    bestCost, bestLabels, bestMedoids = numpy.inf, None, None
+    moves = 0
+    for local in range(numLocal):
+        medoids = rng.choice(n, k, replace=False)
+        cost, labels = medoidCost(distances, medoids, n)
+        tries = 0
+        while tries < maxNeighbor:
+            neighbor = medoids.copy()
+            neighbor[rng.integers(k)] = rng.choice(numpy.setdiff1d(numpy.arange(n), medoids))
+            neighborCost, neighborLabels = medoidCost(distances, neighbor, n)
+            if neighborCost < cost:
+                medoids, cost, labels = neighbor, neighborCost, neighborLabels
+                moves += 1
+                tries = 0
+            else:
+                tries += 1
+        if cost < bestCost:
+            bestCost, bestLabels, bestMedoids = cost, labels, medoids
+    return bestLabels, bestMedoids, moves
+
+#when there are at most this many times count k-subsets, they are all listed and count of them drawn
+enumerationFactor = 4
+
+#sampleCombinations gives up after drawing this many times count rows
+maxDrawFactor = 16
+
+#random values held per batch of sampleCombinations (about 32 MB)
+sampleBatchValues = 2 ** 22
+
+#Draw count distinct k-subsets of range(n), as a (count x k) array of sorted rows, without listing every combination
+#When there are few subsets (at most enumerationFactor * count) they are listed with itertools.combinations and count of
+#them drawn. Otherwise rows are drawn in vectorized batches and rejected when they were already drawn (a hash set of the
+#drawn subsets), so at least 3/4 of the rows are new. Rows are k random items, rejected when an item repeats, if k is
+#small enough that at most 1/4 of them repeat one (k^2 <= n/2), otherwise the k smallest of n random keys
+def sampleCombinations(n, k, count, rng):
+    total = math.comb(n, k)
+    if count > total:
+        raise ValueError(f'cannot draw {count} distinct {k}-subsets of {n} items, there are only {total}')
+    if total <= enumerationFactor * count:
+        combinations = numpy.array(list(itertools.combinations(range(n), k)), dtype=numpy.int64).reshape(total, k)
+        return combinations[rng.choice(total, size=count, replace=False)]
+
+    withRepeats = 2 * k * k <= n
+    seen = set()
+    samples = numpy.zeros((count, k), dtype=numpy.int64)
+    drawn = 0
+    draws = 0
+    while draws < maxDrawFactor * count + 1024:
+        batchRows = min(2 * (count - drawn) + 16, max(1, sampleBatchValues // (k if withRepeats else n)))
+        draws += batchRows
+        if withRepeats:
+            batch = numpy.sort(rng.integers(0, n, size=(batchRows, k)), axis=1)
+            batch = batch[(numpy.diff(batch, axis=1) > 0).all(axis=1)]
+        else:
+            batch = numpy.sort(numpy.argpartition(rng.random((batchRows, n)), k - 1, axis=1)[:, :k], axis=1)
+        for row in batch:
+            key = tuple(row.tolist())
+            if key in seen:
+                continue
+            seen.add(key)
+            samples[drawn] = row
+            drawn += 1
+            if drawn == count:
+                return samples
+    raise RuntimeError(f'drew only {drawn} of {count} distinct {k}-subsets of {n} items in {draws} draws')
+
+#Score a clustering from medoidSimilarities, the similarities of every NP to every medoid (NPs x k, one gather of the
+#medoid columns), and labels, the cluster of every NP. Works for any k; returns a dict of
+#   similaritySum, similarityAvg     similarity of each NP to its own medoid
+#   distanceSum, distanceAvg         distance (1 - similarity) of each NP to its own medoid
+#   interClusterDistanceAvg          average distance of each NP to the other k-1 medoids
+#   silhouette                       average medoid silhouette (b-a)/max(a,b), a the distance to the own medoid and
+#                                    b the distance to the nearest other medoid; 0 for k = 1
+def clusteringScores(medoidSimilarities, labels):
+    medoidDistances = 1 - numpy.asarray(medoidSimilarities, dtype=numpy.float64)
+    npAmount, k = medoidDistances.shape
+    rows = numpy.arange(npAmount)
+    ownDistances = medoidDistances[rows, labels]
+    scores = {
+        'similaritySum': npAmount - ownDistances.sum(),
+        'distanceSum': ownDistances.sum(),
+        'interClusterDistanceAvg': (medoidDistances.sum() - ownDistances.sum()) / max(npAmount * (k - 1), 1),
+        'silhouette': 0.0,
+    }
+    scores['similarityAvg'] = scores['similaritySum'] / npAmount
+    scores['distanceAvg'] = scores['distanceSum'] / npAmount
+    if k > 1:
+        medoidDistances[rows, labels] = numpy.inf
+        otherDistances = medoidDistances.min(axis=1)
+        largest = numpy.maximum(ownDistances, otherDistances)
+        scores['silhouette'] = numpy.divide(otherDistances - ownDistances, largest, out=numpy.zeros(npAmount), where=largest > 0).mean()
+    return scores
+
+#Silhouette of every NP from the square distance matrix: the mean distance to every cluster is one product with the
+#NP x k membership matrix; a is the mean distance to the other NPs of the own cluster, b the smallest mean distance to
+#another cluster, s = (b-a)/max(a,b), and 0 for NPs alone in their cluster
+def silhouetteSamples(distances, labels, k):
+    npAmount = len(labels)
+    membership = numpy.zeros((npAmount, k))
+    membership[numpy.arange(npAmount), labels] = 1
+    sizes = membership.sum(axis=0)
+    clusterSums = distances @ membership
+    ownSizes = sizes[labels]
+    a = clusterSums[numpy.arange(npAmount), labels] / numpy.maximum(ownSizes - 1, 1)
+    clusterMeans = clusterSums / numpy.maximum(sizes, 1)
+    clusterMeans[numpy.arange(npAmount), labels] = numpy.inf
+    clusterMeans[:, sizes == 0] = numpy.inf
+    b = clusterMeans.min(axis=1) if k > 1 else numpy.zeros(npAmount)
+    largest = numpy.maximum(a, b)
+    return numpy.divide(b - a, largest, out=numpy.zeros(npAmount), where=(ownSizes > 1) & (largest > 0) & numpy.isfinite(b))
+
+#Cluster similarities for every k in kValues with restarts FasterPAM runs each, from random medoids drawn by an rng seeded
+#with (seed, k, restart). The distance matrix is built once and shared by every k and restart. For each k the run with the
+#lowest total medoid distance is kept; returns a dict of arrays over kValues: 'k', 'totalDistance', 'silhouette' (mean
+#silhouette of the kept run), the kept 'labels' and 'medoids' of every k, and 'bestK', the k with the highest silhouette
+def kSweep(similarities, kValues, restarts=10, seed=0):
+    distances = 1 - numpy.asarray(similarities, dtype=numpy.float64)
+    npAmount = len(distances)
+    sweep = {'k': numpy.array(kValues), 'totalDistance': numpy.zeros(len(kValues)), 'silhouette': numpy.zeros(len(kValues)),
+             'labels': [], 'medoids': []}
+    for i, k in enumerate(kValues):
+        best = None
+        for restart in range(restarts):
+            rng = numpy.random.default_rng([seed, k, restart])
+            labels, medoids, swaps = fasterPAM(distances, rng.choice(npAmount, k, replace=False))
+            totalDistance = distances[:, medoids].min(axis=1).sum()
+            if best is None or totalDistance < best[0]:
+                best = (totalDistance, labels, medoids)
+        sweep['totalDistance'][i] = best[0]
+        sweep['silhouette'][i] = silhouetteSamples(distances, best[1], k).mean()
+        sweep['labels'].append(best[1])
+        sweep['medoids'].append(best[2])
+    sweep['bestK'] = int(sweep['k'][sweep['silhouette'].argmax()])
+    return sweep
+
+#distance of (similarityAvg, interClusterDistanceAvg) to the ideal (1,1), smaller is better
+def balanceDistance(similarityAvg, interClusterDistanceAvg):
+    return numpy.sqrt((1 - similarityAvg) ** 2 + (1 - interClusterDistanceAvg) ** 2)
+
+#criteria tracked by multiStartSearch: (name, key of the result, True if larger is better)
+searchCriteria = [('similarity', 'similarityAvg', True), ('distance', 'interClusterDistanceAvg', True), ('balance', 'balance', False)]
+
+#True if candidate beats best on key; equal scores go to the lower restart number, so results do not depend on chunking
+def isBetter(candidate, best, key, larger):
+    if best is None:
+        return True
+    if candidate[key] != best[key]:
+        return (candidate[key] > best[key]) == larger
+    return candidate['restart'] < best['restart']
+
+#similarity matrix of the worker processes, set once by initSearchWorker
+searchState = {}
+
+def initSearchWorker(similarities):
+    searchState['similarities'] = similarities
+
+#Run restarts start..end-1 of a multi-start search, keeping only the best result of each criterion
+#Restart r draws its tie-break preferences (and its initial medoids, when none are given) from an rng seeded with (seed, r)
+def runSearchChunk(task):
+    start, end, k, seed, initialMedoids, keepScores = task
+    similarities = searchState['similarities']
+    best = {name: None for name, key, larger in searchCriteria}
+    scores = numpy.zeros((end - start, 2)) if keepScores else None
+    for i, restart in enumerate(range(start, end)):
+        rng = numpy.random.default_rng([seed, restart])
+        medoids = initialMedoids[i] if initialMedoids is not None else rng.choice(len(similarities), k, replace=False)
+        labels, finalMedoids, iterations = runKMedoids(similarities, medoids, randomPreferences(len(similarities), k, rng))
+        clusterScores = clusteringScores(similarities[:, finalMedoids], labels)
+        similarityAvg, interClusterDistanceAvg = clusterScores['similarityAvg'], clusterScores['interClusterDistanceAvg']
+        if keepScores:
+            scores[i] = similarityAvg, interClusterDistanceAvg
+        result = {'restart': restart, 'similarityAvg': similarityAvg, 'interClusterDistanceAvg': interClusterDistanceAvg,
+                  'balance': balanceDistance(similarityAvg, interClusterDistanceAvg)}
+        for name, key, larger in searchCriteria:
+            if isBetter(result, best[name], key, larger):
+                if 'labels' not in result:
+                    result.update({'initialMedoids': numpy.array(medoids), 'labels': labels, 'medoids': finalMedoids})
+                best[name] = result
+    return start, best, scores
+
+#Run restarts independent k-medoids clusterings of similarities and return the best clustering by intra-cluster similarity
+#('similarity'), inter-cluster distance ('distance') and balance of both ('balance'), as dicts with the restart number, labels,
+#medoids and scores. Restarts are spread over a process pool in chunks; every restart has its own seeded rng, so the result
+#is the same for any amount of workers. initialMedoids optionally gives the starting medoids of every restart (restarts x k);
+#with distinctStarts they are sampled as distinct k-subsets (see sampleCombinations) from an rng seeded with seed.
+#With keepScores, 'scores' holds the (similarityAvg, interClusterDistanceAvg) of every restart
+def multiStartSearch(similarities, k, restarts, seed=0, workers=None, initialMedoids=None, chunkSize=1000, keepScores=False,
+                     distinctStarts=False):
+    similarities = numpy.asarray(similarities, dtype=numpy.float64)
+    if initialMedoids is None and distinctStarts:
+        initialMedoids = sampleCombinations(len(similarities), k, restarts, numpy.random.default_rng(seed))
+    chunks = [(start, min(start + chunkSize, restarts)) for start in range(0, restarts, chunkSize)]
+    tasks = [(start, end, k, seed, None if initialMedoids is None else numpy.asarray(initialMedoids[start:end]), keepScores)
+             for start, end in chunks]
+
+    if workers == 1:
+        initSearchWorker(similarities)
+        chunkResults = [runSearchChunk(t) for t in tasks]
+    else:
+        with multiprocessing.get_context('spawn').Pool(workers or os.cpu_count(), initializer=initSearchWorker,
+                                                       initargs=(similarities,)) as pool:
+            chunkResults = pool.map(runSearchChunk, tasks)
+
+    results = {name: None for name, key, larger in searchCriteria}
+    scores = numpy.zeros((restarts, 2)) if keepScores else None
+    for start, best, chunkScores in chunkResults:
+        for name, key, larger in searchCriteria:
+            if best[name] is not None and isBetter(best[name], results[name], key, larger):
+                results[name] = best[name]
+        if keepScores:
+            scores[start:start + len(chunkScores)] = chunkScores
+    results['scores'] = scores
+    return results
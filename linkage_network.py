@@ -0,0 +1,62 @@
+import numpy
+import pandas as pd
+
+#ways of choosing the linkage above which two windows are connected
+thresholdMethods = ['mean', 'percentile', 'absolute']
+
+#Linkage threshold of a square linkage matrix (array or DataFrame), computed over the off-diagonal entries only:
+#   'mean'        average linkage of every pair of different windows (value is ignored)
+#   'percentile'  the value-th percentile (0-100) of those linkages
+#   'absolute'    value itself
+def linkageThreshold(linkage, method='mean', value=None):
+    linkage = numpy.asarray(linkage, dtype=numpy.float64)
+    windowCount = len(linkage)
+    if method == 'mean':
+        return (linkage.sum() - numpy.trace(linkage)) / (windowCount * (windowCount - 1))
+    if method == 'percentile':
+        return numpy.percentile(linkage[~numpy.eye(windowCount, dtype=bool)], value)
+    if method == 'absolute':
+        return float(value)
+    raise ValueError('method must be one of ' + str(thresholdMethods) + ', got ' + str(method))
+
+#Adjacency of the linkage network: windows A and B are connected when their linkage is above the threshold (see
+#linkageThreshold), never to themselves. Returns a boolean array, or a scipy.sparse CSR matrix with sparse=True, and the threshold
+def linkageAdjacency(linkage, method='mean', value=None, sparse=False):
+    threshold = linkageThreshold(linkage, method, value)
+    adjacency = numpy.asarray(linkage) > threshold
+    numpy.fill_diagonal(adjacency, False)
+    if sparse:
+        import scipy.sparse
+        adjacency = scipy.sparse.csr_matrix(adjacency)
+    return adjacency, threshold
+
+#Edges of an adjacency (dense or sparse) as two arrays of node positions, each undirected edge once with row < column
+def adjacencyEdges(adjacency):
+    if hasattr(adjacency, 'tocoo'):
+        coo = adjacency.tocoo()
+        rows, columns = coo.row, coo.col
+    else:
+        rows, columns = numpy.nonzero(adjacency)
+    upper = rows < columns
+    return rows[upper], columns[upper]
+
+#Symmetric scipy.sparse CSR adjacency of nodeCount nodes from undirected edge arrays (such as tiled_linkage.tiledThresholdEdges)
+def adjacencyFromEdges(rows, columns, nodeCount):
+    import scipy.sparse
+    rows, columns = numpy.asarray(rows), numpy.asarray(columns)
+    values = numpy.ones(2 * len(rows), dtype=bool)
+    return scipy.sparse.csr_matrix((values, (numpy.r_[rows, columns], numpy.r_[columns, rows])), shape=(nodeCount, nodeCount))
+
+#degree of every node divided by the amount of other nodes
+def degreeCentrality(adjacency):
+    degrees = numpy.asarray(adjacency.sum(axis=1)).ravel()
+    return degrees / max(adjacency.shape[0] - 1, 1)
+
+#Rank nodes by centrality, highest first. Ties keep the order of indices and share their rank (1 = most central),
+#so no node is lost when centralities are equal. Returns a DataFrame with columns node, centrality and rank
+def rankCentralities(centrality, indices):
+    centrality = numpy.asarray(centrality)
+    order = numpy.argsort(-centrality, kind='stable')
+    rankedDf = pd.DataFrame({'node': numpy.asarray(indices)[order], 'centrality': centrality[order]})
+    rankedDf['rank'] = rankedDf['centrality'].rank(method='min', ascending=False).astype(int)
+    return rankedDf
@@ -1,32 +1,28 @@
 import numpy
 import math
 import pandas as pd
-import matplotlib.pyplot as plt
+import gam_data
+import feature_tracks
+from plotting import plt, nx
 import hist1_analysis as h1_mod
-import seaborn as sns
+import linkage_network
+import graph_centrality
+import graph_layout
 import random
-import plotly.express as px
-import plotly.graph_objects as go
-import networkx as nx
 
 def main():
     #input data file
     dataFile = 'GSE64881_segmentation_at_30000bp.passqc.multibam.txt'
-    df = pd.read_csv(dataFile,sep='\t')
+    #windowValuesDf columns denote chromosome name and start and stop position, windowDetectionsDf columns denote an NP
+    #rows denote a window in both; loaded from a memory-mapped binary cache of dataFile
+    windowValuesDf, windowDetectionsDf = gam_data.loadSegmentationData(dataFile)
 
     featureFile = 'Hist1_region_features.csv'
-    featureDf = pd.read_csv(featureFile)
 
     #open output file
     outputFile = open("reports/network-centrality-1-report.md", 'w')
     outputFile.write('# Network Centrality 1 Report\n')
 
-    #columns denote an NP, rows denote a window
-    windowDetectionsDf = df.iloc[:,3:]
-
-    #columns denote chromosome name and start and stop position, rows denote a window
-    windowValuesDf = df.iloc[:,0:3]
-
     #extract Hist1 windows and NPs
     hist1Windows = h1_mod.findHist1Windows(windowValuesDf)
     hist1WindowDetectionsDf = windowDetectionsDf.iloc[hist1Windows,:]
@@ -34,56 +30,35 @@ def main():
     hist1NpSums = h1_mod.windowsPerNP(hist1WindowDetectionsDf)
     hist1NPs = list(hist1NpSums.index)
 
-    #change indices of featureDf to be the same as windowValuesDf
-    featureDf = featureDf.set_index(hist1WindowValuesDf.index)
+    #feature annotations of the Hist1 windows, joined on their coordinates
+    featureDf = feature_tracks.regionFeatures(featureFile, hist1WindowValuesDf)
 
     #create the normalized linkage table
-    linkageArray = [[0.0 for i in hist1WindowDetectionsDf.index] for x in hist1WindowDetectionsDf.index]
     indices = hist1WindowDetectionsDf.index
-    linkageTable = pd.DataFrame(linkageArray,index=indices,columns=indices)
-    for i in indices:
-        for x in indices:
-            linkageTable.loc[i,x] = h1_mod.normalizedLinkage(hist1WindowDetectionsDf.loc[i,:],hist1WindowDetectionsDf.loc[x,:])
+    linkageTable = h1_mod.normalizedLinkageMatrix(hist1WindowDetectionsDf)
 
-    #find the average of all linkages
-    sum = 0
-    div = 0
-    for i in indices:
-        for x in indices:
-            if i != x:
-                sum += linkageTable.loc[i,x]
-                div += 1
-    averageLinkage = sum/div
+    #connect each pair of windows whose linkage is above the average of all linkages
+    adjacency, averageLinkage = linkage_network.linkageAdjacency(linkageTable, 'mean')
     outputFile.write('average normalized linkage: ' + str(averageLinkage) + '\n\n')
 
-
-    #convert linkage table to an adjacency matrix
-    linkageGraph = linkageTable.copy(deep=True)
-    for i in indices:
-        for x in indices:
-            if i == x:
-                linkageGraph.loc[i,x] = 0 
-            elif linkageTable.loc[i,x] > averageLinkage:
-                linkageGraph.loc[i,x] = 1
-            else:
-                linkageGraph.loc[i,x] = 0
-
-    #find degree centrality for each window
-    degreeCentrality = {i: fsum(linkageGraph.loc[i,:])/(len(linkageGraph.loc[i,:])-1) for i in indices}
-    revCentralities = {degreeCentrality[i]: i for i in indices}
-    sortedCentralities = {revCentralities[c]: c for c in sorted(revCentralities)}
-
-
-    for i in sortedCentralities:
-        print(i,sortedCentralities[i], (len(linkageGraph.loc[i,:])-1))
+    #find degree centrality for each window, ranked from most to least central (equal centralities share a rank)
+    degreeCentrality = pd.Series(linkage_network.degreeCentrality(adjacency), index=indices)
+    rankedCentralities = linkage_network.rankCentralities(degreeCentrality, indices)
+    print(rankedCentralities.to_string(index=False))
+
+    #compute every centrality measure on the sparse adjacency and report the most central windows of each
+    centralityDf = graph_centrality.centralityTable(adjacency, indices)
+    for measure in graph_centrality.centralityMeasures:
+        topWindows = linkage_network.rankCentralities(centralityDf[measure], indices).head(10)
+        outputFile.write(f'Most central windows by {measure} centrality: ')
+        outputFile.write(', '.join(f'{w} ({round(c,4)})' for w, c in zip(topWindows['node'], topWindows['centrality'])) + '\n\n')
     
     #create a visualization of the network
+    edgeRows, edgeColumns = linkage_network.adjacencyEdges(adjacency)
     g = nx.Graph()
-    for i in indices:
-        for x in indices:
-            if i > x and linkageGraph.loc[i,x]:
-                g.add_edge(i,x)
-    pos = nx.spring_layout(g,iterations=1000)
+    g.add_edges_from(zip(indices[edgeRows], indices[edgeColumns]))
+    #force-directed layout of every window, cached on disk and shared with community-detection-1.py
+    pos = graph_layout.cachedLayout(adjacency, indices, iterations=1000)
     plt.figure()
     nodes = list(g.nodes)
     nodeColors = ['tab:red','tab:orange','tab:green','tab:blue']
@@ -99,10 +74,5 @@ def main():
 
     return 
 
-def fsum(fArr):
-    sum = 0
-    for i in fArr: sum += i
-    return sum 
-
 if __name__ == "__main__":
     main()
@@ -0,0 +1,114 @@
+import os
+import multiprocessing
+from multiprocessing import shared_memory
+import numpy
+import pandas as pd
+import hist1_analysis as h1_mod
+
+#number of items on each side of a tile handed to a worker
+defaultTileSize = 512
+
+#environment variables that keep each worker's BLAS single threaded, so workers do not oversubscribe the cores
+blasThreadVariables = ['OMP_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'MKL_NUM_THREADS', 'VECLIB_MAXIMUM_THREADS', 'NUMEXPR_NUM_THREADS']
+
+#metrics that can be computed, each maps (intersections, countsA, countsB, attributeCount) to a block of values
+pairMetrics = {
+    'jaccard': lambda co, cA, cB, n: h1_mod.jaccardFromCounts(co, cA, cB),
+    'normalizedJaccard': lambda co, cA, cB, n: h1_mod.normalizedJaccardFromCounts(co, cA, cB),
+    'normalizedLinkage': lambda co, cA, cB, n: h1_mod.normalizedLinkageFromFrequencies(cA / n, cB / n, co / n),
+}
+
+#state of each worker process, set once by initWorker
+workerState = {}
+
+#attach a worker to the shared input detections and the shared (or memory-mapped) output matrix
+def initWorker(inputName, inputShape, outputName, outputFile, outputShape, metric):
+    inputMemory = shared_memory.SharedMemory(name=inputName)
+    workerState['inputMemory'] = inputMemory
+    workerState['detections'] = numpy.ndarray(inputShape, dtype=numpy.uint8, buffer=inputMemory.buf)
+    if outputFile is None:
+        outputMemory = shared_memory.SharedMemory(name=outputName)
+        workerState['outputMemory'] = outputMemory
+        workerState['output'] = numpy.ndarray(outputShape, dtype=numpy.float32, buffer=outputMemory.buf)
+    else:
+        workerState['output'] = numpy.load(outputFile, mmap_mode='r+')
+    workerState['counts'] = workerState['detections'].sum(axis=1, dtype=numpy.int64).astype(numpy.float64)
+    workerState['metric'] = pairMetrics[metric]
+
+#compute one tile of the pair matrix and write it, and its mirror, straight into the shared output
+def computeTile(bounds):
+    rowStart, rowEnd, colStart, colEnd = bounds
+    detections = workerState['detections']
+    counts = workerState['counts']
+    rowTile = detections[rowStart:rowEnd].astype(numpy.float32)
+    colTile = detections[colStart:colEnd].astype(numpy.float32)
+    intersections = (rowTile @ colTile.T).astype(numpy.float64)
+    block = workerState['metric'](intersections, counts[rowStart:rowEnd, None], counts[None, colStart:colEnd], detections.shape[1])
+    output = workerState['output']
+    output[rowStart:rowEnd, colStart:colEnd] = block
+    output[colStart:colEnd, rowStart:rowEnd] = block.T
+    return rowEnd - rowStart
+
+#the upper triangle of tiles of an itemCount x itemCount matrix
+def upperTiles(itemCount, tileSize):
+    starts = range(0, itemCount, tileSize)
+    return [(r, min(r + tileSize, itemCount), c, min(c + tileSize, itemCount)) for r in starts for c in starts if c >= r]
+
+#Compute a symmetric pairwise metric between every pair of rows of detections (rows denote the items compared,
+#columns denote their binary attributes) using a pool of worker processes. The detections are placed in shared memory
+#once, and workers write their tiles directly into a shared float32 output, or into a .npy memmap when outputFile is given
+#metric is one of 'jaccard', 'normalizedJaccard' or 'normalizedLinkage'; workers defaults to the number of cores
+def parallelPairwise(detections, metric, workers=None, tileSize=defaultTileSize, outputFile=None):
+    if metric not in pairMetrics:
+        raise ValueError('unknown metric ' + str(metric))
+    detections = numpy.asarray(detections)
+    itemCount = detections.shape[0]
+    outputShape = (itemCount, itemCount)
+    workers = workers or os.cpu_count()
+
+    inputMemory = shared_memory.SharedMemory(create=True, size=max(detections.size, 1))
+    outputMemory = None
+    try:
+        numpy.ndarray(detections.shape, dtype=numpy.uint8, buffer=inputMemory.buf)[:] = detections == 1
+        if outputFile is None:
+            outputMemory = shared_memory.SharedMemory(create=True, size=max(itemCount * itemCount * 4, 1))
+            outputName = outputMemory.name
+        else:
+            numpy.lib.format.open_memmap(outputFile, mode='w+', dtype=numpy.float32, shape=outputShape).flush()
+            outputName = None
+
+        savedEnvironment = {v: os.environ.get(v) for v in blasThreadVariables}
+        os.environ.update({v: '1' for v in blasThreadVariables})
+        try:
+            context = multiprocessing.get_context('spawn')
+            initArgs = (inputMemory.name, detections.shape, outputName, outputFile, outputShape, metric)
+            with context.Pool(workers, initializer=initWorker, initargs=initArgs) as pool:
+                for done in pool.imap_unordered(computeTile, upperTiles(itemCount, tileSize)):
+                    pass
+        finally:
+            for v, value in savedEnvironment.items():
+                if value is None:
+                    os.environ.pop(v, None)
+                else:
+                    os.environ[v] = value
+
+        if outputFile is None:
+            return numpy.ndarray(outputShape, dtype=numpy.float32, buffer=outputMemory.buf).copy()
+        return numpy.load(outputFile, mmap_mode='r')
+    finally:
+        inputMemory.close()
+        inputMemory.unlink()
+        if outputMemory is not None:
+            outputMemory.close()
+            outputMemory.unlink()
+
+#parallel equivalent of h1_mod.jaccardMatrices(...)[metric] for the NPs in hist1NPs, returned as a DataFrame indexed by NP
+def parallelJaccardMatrix(hist1WindowDetectionsDf, hist1NPs, metric='normalizedJaccard', workers=None):
+    detections = hist1WindowDetectionsDf.loc[:,hist1NPs].to_numpy().T
+    return pd.DataFrame(parallelPairwise(detections, metric, workers), index=hist1NPs, columns=hist1NPs)
+
+#parallel equivalent of h1_mod.normalizedLinkageMatrix, returned as a DataFrame indexed by window
+def parallelLinkageMatrix(hist1WindowDetectionsDf, workers=None, outputFile=None):
+    indices = hist1WindowDetectionsDf.index
+    linkage = parallelPairwise(hist1WindowDetectionsDf.to_numpy(), 'normalizedLinkage', workers, outputFile=outputFile)
+    return pd.DataFrame(linkage, index=indices, columns=indices)
@@ -0,0 +1,109 @@
+import os
+import multiprocessing
+import numpy
+import pandas as pd
+import scipy.sparse
+
+#Permutation tests of group x feature statistics: the statistic of group g and feature f is the mean, over the items of g,
+#of the item's feature value, where the value of item i is (W^T F)[i,f] / (column sum of W)[i] for a windows x items weight
+#matrix W (detections for NPs, None for windows themselves) and a windows x features 0/1 feature matrix F.
+#Null distributions come from shuffling the group labels ('labels') or circularly shifting F along the genome ('shift'),
+#which keeps the autocorrelation of the features. Every batch of permutations is one matrix product
+
+#number of permutations evaluated by one product
+defaultBatchSize = 100
+
+#arrays of the worker processes, set once by initPermutationWorker
+permutationState = {}
+
+#values of every item for every column of featureMatrix (windows x columns), see the module comment
+def itemValues(weights, featureMatrix):
+    if weights is None:
+        return featureMatrix
+    weightSums = numpy.asarray(weights.sum(axis=0)).ravel()[:, None]
+    return numpy.divide(numpy.asarray(weights.T @ featureMatrix), weightSums, out=numpy.zeros((weights.shape[1], featureMatrix.shape[1])),
+                        where=weightSums > 0)
+
+#Means over the items of each group for a batch of labelings (batch x items, groups 0..k-1): one sparse product of the
+#stacked (batch * k) x items membership matrix with the values (items x features). Returns batch x k x features
+def batchGroupMeans(labelBatch, values, k):
+    batch, itemCount = labelBatch.shape
+    rows = (numpy.arange(batch)[:, None] * k + labelBatch).ravel()
+    membership = scipy.sparse.csr_matrix((numpy.ones(batch * itemCount), (rows, numpy.tile(numpy.arange(itemCount), batch))),
+                                         shape=(batch * k, itemCount))
+    sizes = numpy.asarray(membership.sum(axis=1)).reshape(batch, k, 1)
+    sums = numpy.asarray(membership @ values).reshape(batch, k, values.shape[1])
+    return numpy.divide(sums, sizes, out=numpy.full(sums.shape, numpy.nan), where=sizes > 0)
+
+#spawn pool for permutationTest calls that share it (see permutationTest), so many tests start the workers only once
+def permutationPool(workers=None):
+    return multiprocessing.get_context('spawn').Pool(workers or os.cpu_count())
+
+def initPermutationWorker(weights, featureMatrix, labels, k, mode):
+    permutationState.update({'weights': weights, 'featureMatrix': featureMatrix, 'labels': labels, 'k': k, 'mode': mode,
+                             'values': itemValues(weights, featureMatrix)})
+
+#Statistics of permutations start..end-1; permutation p draws from an rng seeded with (seed, p) so results do not depend
+#on the batching or the amount of workers. Tasks for a shared pool carry the arguments of initPermutationWorker, which
+#is then run for the task; otherwise they are None and the worker was initialized when its pool started
+#Returns batch x k x features
+def runPermutationBatch(task):
+    start, end, seed, initArgs = task
+    if initArgs is not None:
+        initPermutationWorker(*initArgs)
+    labels, k, featureMatrix = permutationState['labels'], permutationState['k'], permutationState['featureMatrix']
+    rngs = [numpy.random.default_rng([seed, p]) for p in range(start, end)]
+    if permutationState['mode'] == 'labels':
+        labelBatch = numpy.stack([rng.permutation(labels) for rng in rngs])
+        return batchGroupMeans(labelBatch, permutationState['values'], k)
+    #every shifted copy of the feature matrix side by side, so all item values come from one product
+    windowCount, featureCount = featureMatrix.shape
+    shifts = numpy.array([rng.integers(1, windowCount) for rng in rngs])
+    shifted = featureMatrix[(numpy.arange(windowCount)[None, :] - shifts[:, None]) % windowCount]
+    values = itemValues(permutationState['weights'], shifted.transpose(1, 0, 2).reshape(windowCount, -1))
+    means = batchGroupMeans(labels[None, :], values, k)[0]
+    return means.reshape(k, len(shifts), featureCount).transpose(1, 0, 2)
+
+#Permutation test of the group x feature means (see the module comment) with permutations random relabelings
+#(mode='labels') or circular feature shifts (mode='shift'). labels gives the group (0..k-1) of every item, features the
+#names of the columns of featureMatrix. Batches run across a pool of workers (workers=1 runs them in this process)
+#started for this call, or across pool (see permutationPool), which callers running many tests create once and reuse
+#Returns a dict of group x feature DataFrames: 'observed', 'nullMean', 'zScore', 'pValue' (two-sided) and 'pEnriched'
+#(one-sided, observed above the null), with empirical p-values (1 + exceedances) / (1 + permutations)
+def permutationTest(featureMatrix, labels, features, weights=None, mode='labels', permutations=1000, seed=0, workers=None,
+                    batchSize=defaultBatchSize, pool=None):
+    if mode not in ('labels', 'shift'):
+        raise ValueError("mode must be 'labels' or 'shift', got " + str(mode))
+    featureMatrix = numpy.asarray(featureMatrix, dtype=numpy.float64)
+    labels = numpy.asarray(labels)
+    k = int(labels.max()) + 1
+    if weights is not None:
+        weights = scipy.sparse.csc_matrix(weights, dtype=numpy.float64)
+    observed = batchGroupMeans(labels[None, :], itemValues(weights, featureMatrix), k)[0]
+
+    tasks = [(start, min(start + batchSize, permutations), seed, None) for start in range(0, permutations, batchSize)]
+    initArgs = (weights, featureMatrix, labels, k, mode)
+    if pool is not None:
+        batches = pool.map(runPermutationBatch, [task[:3] + (initArgs,) for task in tasks])
+    elif workers == 1:
+        initPermutationWorker(*initArgs)
+        batches = [runPermutationBatch(t) for t in tasks]
+    else:
+        with multiprocessing.get_context('spawn').Pool(workers or os.cpu_count(), initializer=initPermutationWorker,
+                                                       initargs=initArgs) as workerPool:
+            batches = workerPool.map(runPermutationBatch, tasks)
+    null = numpy.concatenate(batches)
+
+    nullMean = numpy.nanmean(null, axis=0)
+    nullStd = numpy.nanstd(null, axis=0)
+    zScores = numpy.divide(observed - nullMean, nullStd, out=numpy.zeros(observed.shape), where=nullStd > 0)
+    extreme = (numpy.abs(null - nullMean) >= numpy.abs(observed - nullMean) - 1e-12).sum(axis=0)
+    above = (null >= observed - 1e-12).sum(axis=0)
+    table = lambda values: pd.DataFrame(values, index=pd.RangeIndex(k, name='group'), columns=features)
+    return {
+        'observed': table(observed),
+        'nullMean': table(nullMean),
+        'zScore': table(zScores),
+        'pValue': table((1 + extreme) / (1 + permutations)),
+        'pEnriched': table((1 + above) / (1 + permutations)),
+    }
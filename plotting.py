@@ -0,0 +1,20 @@
+import importlib
+
+#Stand-in for a module that is only imported the first time one of its attributes is used, so numerical runs that
+#never render a chart do not pay for importing the visualization libraries
+class LazyModule:
+
+    def __init__(self, name):
+        self.moduleName = name
+        self.module = None
+
+    def __getattr__(self, attr):
+        if self.module is None:
+            self.module = importlib.import_module(self.moduleName)
+        return getattr(self.module, attr)
+
+#visualization libraries, each imported when a chart first uses it
+plt = LazyModule('matplotlib.pyplot')
+sns = LazyModule('seaborn')
+nx = LazyModule('networkx')
+go = LazyModule('plotly.graph_objects')
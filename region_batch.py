@@ -0,0 +1,157 @@
+import os
+import re
+import json
+import random
+import argparse
+import multiprocessing
+import numpy
+import pandas as pd
+import gam_data
+import hist1_analysis as h1_mod
+import linkage_network
+import feature_tracks
+from genome_index import WindowIndex
+
+#analyses that can be run on each region, in the order they run
+batchAnalyses = ['stats', 'jaccard', 'kmedoids', 'linkage', 'centrality', 'features']
+
+#state of each worker process, set once by initWorker
+workerState = {}
+
+#Read a BED-style region list: chrom, start, end and an optional name per line, '#', 'track' and 'browser' lines skipped
+#Returns a list of (name, chrom, start, end); unnamed regions are named chrom-start-end
+def readRegionsBed(bedFile):
+    regions = []
+    with open(bedFile) as f:
+        for line in f:
+            fields = line.strip().split()
+            if not fields or fields[0].startswith('#') or fields[0] in ('track', 'browser'):
+                continue
+            chrom, start, end = fields[0], int(fields[1]), int(fields[2])
+            name = fields[3] if len(fields) > 3 else f'{chrom}-{start}-{end}'
+            regions.append((name, chrom, start, end))
+    return regions
+
+#Output directory names of the regions: characters other than letters, digits, '.', '_' and '-' become '_' and leading
+#dots are dropped (so no '..' and no hidden directories); an empty name becomes region-<position>, and a name repeating an
+#earlier one gets the region's position appended. No region writes outside the output directory or over another region
+def regionDirectoryNames(names):
+    directoryNames = []
+    used = set()
+    for i, name in enumerate(names):
+        directoryName = re.sub(r'[^\w.-]', '_', name).lstrip('.') or 'region'
+        if directoryName == 'region' or directoryName in used:
+            directoryName = f'{directoryName}-{i}'
+        while directoryName in used:
+            directoryName += '_'
+        used.add(directoryName)
+        directoryNames.append(directoryName)
+    return directoryNames
+
+#load the memory-mapped detection matrix once per worker; the pages are shared between workers by the OS
+#featureIndex is the feature_tracks.FeatureIndex of the annotations, or None without feature files
+def initWorker(dataFile, featureIndex=None):
+    windowValuesDf, detections, npNames = gam_data.loadSegmentationArrays(dataFile)
+    workerState['windowValuesDf'] = windowValuesDf
+    workerState['detections'] = detections
+    workerState['npNames'] = npNames
+    workerState['featureIndex'] = featureIndex
+
+#Run the selected analyses on one region and write the results to outputDir/<region name>/
+#task is (name, directory name, windows, analyses, outputDir, seed); returns the region's summary statistics
+def runRegion(task):
+    name, directoryName, windows, analyses, outputDir, seed = task
+    random.seed(seed)
+    regionDir = os.path.join(outputDir, directoryName)
+    os.makedirs(regionDir, exist_ok=True)
+
+    windowValuesDf = workerState['windowValuesDf'].iloc[windows,:]
+    regionDetectionsDf = pd.DataFrame(workerState['detections'][windows], index=windowValuesDf.index, columns=workerState['npNames'])
+    regionNpSums = h1_mod.windowsPerNP(regionDetectionsDf)
+    regionNPs = list(regionNpSums.index)
+    regionWindowDetections = h1_mod.NPsPerWindow(regionDetectionsDf)
+
+    stats = {
+        'region': name,
+        'directory': directoryName,
+        'windows': len(windows),
+        'nps': len(regionNPs),
+        'npDetectionAvg': float(regionNpSums.mean()) if regionNPs else 0.0,
+        'npDetectionMin': float(regionNpSums.min()) if regionNPs else 0.0,
+        'npDetectionMax': float(regionNpSums.max()) if regionNPs else 0.0,
+        'windowDetectionAvg': float(regionWindowDetections.mean()) if len(windows) else 0.0,
+        'windowDetectionMin': int(regionWindowDetections.min()) if len(windows) else 0,
+        'windowDetectionMax': int(regionWindowDetections.max()) if len(windows) else 0,
+    }
+    if 'stats' in analyses:
+        with open(os.path.join(regionDir, 'stats.json'), 'w') as f:
+            json.dump(stats, f, indent=2)
+
+    #window x feature overlaps of the region from the genome-wide annotations
+    featureDf = None
+    if 'features' in analyses and workerState['featureIndex'] is not None:
+        featureDf = workerState['featureIndex'].annotate(windowValuesDf)
+        pd.concat([windowValuesDf, featureDf], axis=1).to_csv(os.path.join(regionDir, 'features.csv'), index=False)
+
+    if ('jaccard' in analyses or 'kmedoids' in analyses) and len(regionNPs) >= 3:
+        npJaccards = h1_mod.jaccardMatrices(regionDetectionsDf, regionNPs)['normalizedJaccard']
+        if 'jaccard' in analyses:
+            npJaccards.to_csv(os.path.join(regionDir, 'jaccard.csv'))
+        if 'kmedoids' in analyses:
+            clusters, clusterMedoids = h1_mod.runKMedoidsClustering(random.sample(regionNPs,3), regionNPs, npJaccards)
+            clusterRows = [[np, i, clusterMedoids[i]] for i, c in enumerate(clusters) for np in c]
+            pd.DataFrame(clusterRows, columns=['np', 'cluster', 'medoid']).to_csv(os.path.join(regionDir, 'clusters.csv'), index=False)
+            if featureDf is not None:
+                npFeatureDf = h1_mod.npFeaturePercentages(regionDetectionsDf[regionNPs], featureDf, list(featureDf.columns))
+                clusterFeatureDf = h1_mod.clusterFeatureEnrichment(npFeatureDf, h1_mod.clusterLabels(clusters))
+                clusterFeatureDf.to_csv(os.path.join(regionDir, 'cluster-features.csv'), index_label='cluster')
+
+    if ('linkage' in analyses or 'centrality' in analyses) and len(windows) >= 2:
+        linkageTable = h1_mod.normalizedLinkageMatrix(regionDetectionsDf)
+        if 'linkage' in analyses:
+            linkageTable.to_csv(os.path.join(regionDir, 'linkage.csv'))
+        if 'centrality' in analyses:
+            adjacency, averageLinkage = linkage_network.linkageAdjacency(linkageTable, 'mean')
+            centralityDf = pd.DataFrame({'window': linkageTable.index, 'degreeCentrality': linkage_network.degreeCentrality(adjacency)})
+            centralityDf.to_csv(os.path.join(regionDir, 'centrality.csv'), index=False)
+
+    return stats
+
+#Run the selected analyses on every region of regions ((name, chrom, start, end) tuples) across a pool of workers
+#The window table is indexed once and each region's windows found with one batched query. Feature annotations are read
+#from featureFiles (BED files or window x feature tables, see feature_tracks.loadFeatureTracks) once for every region
+#Returns a DataFrame of stats
+def runRegionBatch(regions, dataFile, outputDir, analyses=batchAnalyses, workers=None, seed=0, featureFiles=None):
+    windowValuesDf, detections, npNames = gam_data.loadSegmentationArrays(dataFile)
+    featureIndex = feature_tracks.loadFeatureTracks(featureFiles) if featureFiles else None
+    regionWindows = WindowIndex(windowValuesDf).queryMany([(chrom, start, end) for name, chrom, start, end in regions])
+    directoryNames = regionDirectoryNames([name for name, chrom, start, end in regions])
+    tasks = [(name, directoryName, numpy.sort(w), analyses, outputDir, seed + i)
+             for i, ((name, chrom, start, end), directoryName, w) in enumerate(zip(regions, directoryNames, regionWindows))]
+
+    os.makedirs(outputDir, exist_ok=True)
+    with multiprocessing.get_context('spawn').Pool(workers or os.cpu_count(), initializer=initWorker, initargs=(dataFile, featureIndex)) as pool:
+        regionStats = pool.map(runRegion, tasks, chunksize=1)
+    statsDf = pd.DataFrame(regionStats)
+    statsDf.to_csv(os.path.join(outputDir, 'region-stats.csv'), index=False)
+    return statsDf
+
+#usage: python region_batch.py regions.bed [--analyses stats jaccard ...] [--output dir] [--workers n] [--data file]
+#                               [--features annotations.bed ...]
+def main():
+    parser = argparse.ArgumentParser(description='Run the Hist1 analyses on every region of a BED file')
+    parser.add_argument('regions', help='BED file of regions: chrom, start, end and an optional name')
+    parser.add_argument('--analyses', nargs='+', choices=batchAnalyses, default=batchAnalyses)
+    parser.add_argument('--output', default='region-batch', help='directory that receives one subdirectory per region')
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--data', default='GSE64881_segmentation_at_30000bp.passqc.multibam.txt')
+    parser.add_argument('--features', nargs='+', default=None,
+                        help='feature annotations: BED files (chrom, start, end, feature) or window x feature CSV tables')
+    args = parser.parse_args()
+
+    statsDf = runRegionBatch(readRegionsBed(args.regions), args.data, args.output, args.analyses, args.workers, args.seed, args.features)
+    print(statsDf.to_string(index=False))
+
+if __name__ == "__main__":
+    main()
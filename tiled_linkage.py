@@ -0,0 +1,96 @@
+import sys
+import numpy
+import gam_data
+import hist1_analysis as h1_mod
+import linkage_network
+
+#number of windows on each side of a tile
+defaultTileSize = 2048
+
+#yields (start, end) bounds splitting range(0,length) into tiles
+def tileBounds(length, tileSize=defaultTileSize):
+    for start in range(0, length, tileSize):
+        yield start, min(start + tileSize, length)
+
+#Compute the normalized linkage of every pair of windows in detections (rows denote a window, columns denote an NP)
+#tile by tile, counting a detection where the value is 1 like hist1_analysis.normalizedLinkageMatrix. The result is
+#written to outputFile as a disk-backed float32 .npy matrix. Only tiles on or above the diagonal are computed, each is
+#mirrored into its transposed position. Returns the matrix opened read-only
+def computeTiledLinkage(detections, outputFile, tileSize=defaultTileSize):
+    windowCount, npCount = detections.shape
+    linkage = numpy.lib.format.open_memmap(outputFile, mode='w+', dtype=numpy.float32, shape=(windowCount, windowCount))
+
+    frequencies = numpy.zeros(windowCount)
+    for start, end in tileBounds(windowCount, tileSize):
+        frequencies[start:end] = (numpy.asarray(detections[start:end]) == 1).sum(axis=1) / npCount
+
+    for rowStart, rowEnd in tileBounds(windowCount, tileSize):
+        rowTile = (numpy.asarray(detections[rowStart:rowEnd]) == 1).astype(numpy.float32)
+        fA = frequencies[rowStart:rowEnd, None]
+        for colStart, colEnd in tileBounds(windowCount, tileSize):
+            if colEnd <= rowStart:
+                continue
+            colTile = (numpy.asarray(detections[colStart:colEnd]) == 1).astype(numpy.float32)
+            fAB = (rowTile @ colTile.T).astype(numpy.float64) / npCount
+            block = h1_mod.normalizedLinkageFromFrequencies(fA, frequencies[None, colStart:colEnd], fAB)
+            linkage[rowStart:rowEnd, colStart:colEnd] = block
+            linkage[colStart:colEnd, rowStart:rowEnd] = block.T
+        linkage.flush()
+    del linkage
+    return openTiledLinkage(outputFile)
+
+#open a linkage matrix written by computeTiledLinkage without loading it into memory
+def openTiledLinkage(linkageFile):
+    return numpy.load(linkageFile, mmap_mode='r')
+
+#yields (start, end, rows) for consecutive row tiles of a (memory-mapped) linkage matrix
+def iterateTiles(linkage, tileSize=defaultTileSize):
+    for start, end in tileBounds(linkage.shape[0], tileSize):
+        yield start, end, numpy.asarray(linkage[start:end], dtype=numpy.float64)
+
+#average of all off-diagonal linkages, streamed tile by tile
+def tiledAverageLinkage(linkage, tileSize=defaultTileSize):
+    total = 0.0
+    for start, end, rows in iterateTiles(linkage, tileSize):
+        total += rows.sum() - numpy.trace(rows[:, start:end])
+    windowCount = linkage.shape[0]
+    return total / (windowCount * (windowCount - 1))
+
+#degree centrality of each window when two windows are linked if their linkage is above threshold
+def tiledDegreeCentrality(linkage, threshold, tileSize=defaultTileSize):
+    windowCount = linkage.shape[0]
+    degrees = numpy.zeros(windowCount, dtype=numpy.int64)
+    for start, end, rows in iterateTiles(linkage, tileSize):
+        above = rows > threshold
+        above[numpy.arange(end - start), numpy.arange(start, end)] = False
+        degrees[start:end] = above.sum(axis=1)
+    return degrees / (windowCount - 1)
+
+#yields (rowIndices, columnIndices) arrays of the window pairs (row < column) whose linkage is above threshold
+def tiledThresholdEdges(linkage, threshold, tileSize=defaultTileSize):
+    for start, end, rows in iterateTiles(linkage, tileSize):
+        tileRows, columns = numpy.nonzero(rows > threshold)
+        tileRows = tileRows + start
+        upper = tileRows < columns
+        yield tileRows[upper], columns[upper]
+
+#sparse CSR adjacency of the windows whose linkage is above threshold, built tile by tile, for graph_centrality
+def tiledAdjacency(linkage, threshold, tileSize=defaultTileSize):
+    edges = list(tiledThresholdEdges(linkage, threshold, tileSize))
+    rows = numpy.concatenate([r for r, c in edges]) if edges else numpy.zeros(0, dtype=numpy.int64)
+    columns = numpy.concatenate([c for r, c in edges]) if edges else numpy.zeros(0, dtype=numpy.int64)
+    return linkage_network.adjacencyFromEdges(rows, columns, linkage.shape[0])
+
+#Compute the linkage matrix of every window on one chromosome of dataFile and write it to outputFile
+#usage: python tiled_linkage.py <chrom> <outputFile> [dataFile]
+def main():
+    chrom, outputFile = sys.argv[1], sys.argv[2]
+    dataFile = sys.argv[3] if len(sys.argv) > 3 else 'GSE64881_segmentation_at_30000bp.passqc.multibam.txt'
+    windowValuesDf, detections, npNames = gam_data.loadSegmentationArrays(dataFile)
+    chromWindows = numpy.flatnonzero(windowValuesDf['chrom'] == chrom)
+    linkage = computeTiledLinkage(detections[chromWindows], outputFile)
+    averageLinkage = tiledAverageLinkage(linkage)
+    print(chrom, len(chromWindows), 'windows, average normalized linkage:', averageLinkage)
+
+if __name__ == "__main__":
+    main()